@@ -0,0 +1,207 @@
+import gc
+import json
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+from pydantic import BaseModel
+from taskw.utils import encode_task
+
+from . import layout
+from .builder import Builder, BusyRange
+from .models import Day, Task
+from .repository import TaskRepository
+from .settings import CommonSettings, PlannerSettings
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("load", "gaps", "layout", "pack")
+
+
+def synthetic_tasks(count: int, seed: int = 0) -> list[dict]:
+    """pending.data records shaped like a real backlog.
+
+    Mostly small tasks, some tagged, prioritized or due, and about one in
+    twenty bigger than a big block, already split into partial groups the
+    way `Task.break_up_oversized_tasks` would leave them.
+    """
+    rng = random.Random(seed)
+    settings = PlannerSettings()
+    now = int(datetime.now().timestamp())
+    records = []
+    for n in range(count):
+        record = {"description": f"synthetic task {n}",
+                  "entry": str(now - rng.randrange(60 * 86400)),
+                  "status": "pending",
+                  "uuid": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                  "points": str(rng.choice((1, 1, 2, 2, 3, 3, 5, 8)))}
+        if rng.random() < 0.05:
+            record["points"] = str(rng.randint(settings.big_max_points + 1, settings.big_max_points * 4))
+        if rng.random() < 0.3:
+            record["tags"] = rng.sample(["work", "email", "review", "ops", "next"], k=rng.randint(1, 2))
+        if rng.random() < 0.3:
+            record["priority"] = rng.choice("HML")
+        if rng.random() < 0.2:
+            record["due"] = str(now + rng.randrange(-3 * 86400, 30 * 86400))
+        if int(record["points"]) > settings.big_max_points:
+            records.extend(Task._split_record(record))
+        else:
+            records.append(record)
+    return records
+
+
+def synthetic_busy(day: date, meetings: int, seed: int = 0) -> list[BusyRange]:
+    """meetings on the quarter hour during working hours. they may overlap, like real calendars"""
+    rng = random.Random(seed * 1000 + day.toordinal())
+    day_start, day_end = Builder(day)._day_bounds(day)
+    quarters = int((day_end - day_start).total_seconds() // 900)
+    busy = []
+    for _ in range(meetings):
+        start = day_start + timedelta(minutes=15 * rng.randrange(quarters))
+        end = min(day_end, start + timedelta(minutes=rng.choice((15, 30, 30, 45, 60, 90))))
+        busy.append(BusyRange(start=start, end=end))
+    return busy
+
+
+class StageResult(BaseModel):
+    seconds: float
+    peak_kib: float
+
+
+class CaseResult(BaseModel):
+    tasks: int
+    meetings: int
+    days: int
+    stages: dict[str, StageResult]
+    scheduled_points: int
+    capacity_points: int
+    utilization: float
+    fragmentation: float
+    unplaced: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.tasks}x{self.meetings}x{self.days}"
+
+
+def _measure(fn: Callable, repeat: int):
+    """best wall time over `repeat` runs, and the peak allocation of one traced run.
+
+    logging is off while measuring, so a report per unplaced task is not what gets timed.
+    """
+    best = float("inf")
+    logging.disable(logging.CRITICAL)
+    try:
+        for _ in range(repeat):
+            layout.solve.cache_clear()
+            gc.collect()
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        layout.solve.cache_clear()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        logging.disable(logging.NOTSET)
+    return result, StageResult(seconds=best, peak_kib=peak / 1024)
+
+
+def run_case(tasks: int, meetings: int, days: int = 5, repeat: int = 3, seed: int = 0) -> CaseResult:
+    """plan `days` consecutive days of synthetic work and report time, memory and plan quality per stage"""
+    builder = Builder()
+    start = date.today()
+    dates = [start + timedelta(days=n) for n in range(days)]
+    busy = {d: synthetic_busy(d, meetings, seed) for d in dates}
+    with tempfile.TemporaryDirectory() as data:
+        Path(data, "pending.data").write_text("".join(encode_task(r) for r in synthetic_tasks(tasks, seed)))
+        stages = {}
+        queue, stages["load"] = _measure(
+            lambda: Task.get_tasks(Task.OversizeStrategy.ignore, repository=TaskRepository(data)), repeat)
+
+    def gaps():
+        return {d: builder._get_spaces_between_existing_events(*builder._day_bounds(d), busy[d]) for d in dates}
+
+    def build():
+        return [Day(d, blocks=builder._layout_gaps(d, day_gaps[d])) for d in dates]
+
+    def pack():
+        plans = build()
+        remaining = list(queue)
+        for plan in plans:
+            remaining = builder._assign_tasks_to_blocks(remaining, plan)
+        return plans, remaining
+
+    day_gaps, stages["gaps"] = _measure(gaps, repeat)
+    _, stages["layout"] = _measure(build, repeat)
+    (plans, unplaced), stages["pack"] = _measure(pack, repeat)
+    # packing rebuilds the days it fills, so take the layout cost back out
+    stages["pack"].seconds = max(0.0, stages["pack"].seconds - stages["layout"].seconds)
+
+    blocks = [b for plan in plans for b in plan.blocks]
+    capacity = sum(b.max_points for b in blocks)
+    scheduled = sum(t.points for b in blocks for t in b.tasks if "lunch" not in t.tags)
+    free = sum(b.available_points for b in blocks)
+    scattered = sum(b.available_points for b in blocks if b.tasks)
+    return CaseResult(tasks=tasks,
+                      meetings=meetings,
+                      days=days,
+                      stages=stages,
+                      scheduled_points=scheduled,
+                      capacity_points=capacity,
+                      utilization=scheduled / capacity if capacity else 0.0,
+                      fragmentation=scattered / free if free else 0.0,
+                      unplaced=len(unplaced))
+
+
+def run(task_counts: list[int], meeting_counts: list[int], days: int = 5, repeat: int = 3) -> list[CaseResult]:
+    results = []
+    for tasks in task_counts:
+        for meetings in meeting_counts:
+            result = run_case(tasks, meetings, days=days, repeat=repeat)
+            logger.info("%s: %s", result.key, {k: round(v.seconds, 4) for k, v in result.stages.items()})
+            results.append(result)
+    return results
+
+
+def baseline_path() -> Path:
+    return (Path(CommonSettings().state_dir) / "benchmark_baseline.json").expanduser()
+
+
+def save_baseline(results: list[CaseResult], path: Path | None = None) -> None:
+    path = path or baseline_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({r.key: r.model_dump() for r in results}, indent=2))
+
+
+def compare(results: list[CaseResult], path: Path | None = None, tolerance: float = 0.25) -> list[str]:
+    """regressions against the saved baseline.
+
+    A stage regresses when it got more than `tolerance` slower (ignoring
+    anything under a millisecond, which is noise). Plan quality regresses
+    when fewer points get scheduled.
+    """
+    path = path or baseline_path()
+    if not path.exists():
+        return []
+    baseline = {k: CaseResult(**v) for k, v in json.loads(path.read_text()).items()}
+    regressions = []
+    for result in results:
+        before = baseline.get(result.key)
+        if before is None:
+            continue
+        for stage, now in result.stages.items():
+            was = before.stages[stage].seconds
+            if now.seconds > 0.001 and now.seconds > was * (1 + tolerance):
+                regressions.append(f"{result.key} {stage}: {was:.4f}s -> {now.seconds:.4f}s")
+        if result.scheduled_points < before.scheduled_points:
+            regressions.append(f"{result.key} scheduled points: "
+                               f"{before.scheduled_points} -> {result.scheduled_points}")
+    return regressions
@@ -1,44 +1,57 @@
-from datetime import datetime, date
+import uuid
+from datetime import datetime, date, time, timedelta
 from logging import getLogger
+from pydantic import BaseModel
 
-from models import Block, SmallBlock, MediumBlock, BigBlock, Block, Task, Day
-from ingester import GoogleCalendarIngester
-from settings import Settings
+from .models import Block, SmallBlock, MediumBlock, BigBlock, Block, Task, Day
+from .ingester import GoogleCalendarIngester
+from .settings import PlannerSettings
+from .packer import Packer
+from .plan_store import PlanStore
+from .timing import span, timed
+from . import intervals, layout
 
 logger = getLogger(__name__)
 
-class Gap:
+class Gap(BaseModel):
     start: datetime
     end: datetime
     duration: int
 
+class BusyRange(BaseModel):
+    start: datetime
+    end: datetime
+
 class Builder:
     """create a set of blocks for a given day and
     communicate that back to external services.
     """
     date: date
-    blocks: list[Block] = []
+    blocks: list[Block]
     start_time: datetime
     end_time: datetime
+    block_types: tuple[type[Block], ...] = (BigBlock, MediumBlock, SmallBlock)
 
 
     def __init__(self, day: date|str = date.today()):
         try:
             self.date = date.fromisoformat(day)
-        except ValueError:
+        except (TypeError, ValueError):
             self.date = day
-        settings = Settings()
-        self.start_time = datetime.combine(self.date, settings.start_time)
-        self.end_time = datetime.combine(self.date, settings.end_time)
+        self.settings = PlannerSettings()
+        self.blocks = []
+        self.start_time = datetime.combine(self.date, time.fromisoformat(self.settings.start_time))
+        self.end_time = datetime.combine(self.date, time.fromisoformat(self.settings.end_time))
 
     def get_existing_events(self) -> list:
         """get existing events from calendar"""
         gci = GoogleCalendarIngester()
-        existing = gci.get_busy_for_date(self.date,
-                                         after=self.start_time,
-                                         before=self.end_time)
+        return gci.get_busy_for_date(self.date,
+                                     after=self.start_time,
+                                     before=self.end_time)
 
 
+    @timed("builder.bin_packer")
     def bin_packer(self) -> list:
         """use bin packing to create blocks
 
@@ -49,121 +62,163 @@ class Builder:
                 - task was the full previous block (no siblings)
                 - task is the first in this block (siblings follow)
         """
-        gaps = self._get_spaces_between_existing_events(
-            self.start_time,
-            self.end_time,
-            self.get_existing_events())
-        for gap in gaps:
-            blocks = self._next_biggest_block(gap, [BigBlock, MediumBlock, SmallBlock], [])
-            self.blocks.extend(blocks)
-        self._set_lunch_block()
-        available_tasks = Task.get_tasks()
+        self.day = self._build_day(self.date, self.get_existing_events())
+        self.blocks = self.day.blocks
+        self._assign_tasks_to_blocks(Task.get_tasks(), self.day)
+        PlanStore().save(self.day)
+        return self.blocks
+
+    def publish_plan(self, day: Day | None = None) -> None:
+        """write a day's blocks to the calendar, defaults to the day built by bin_packer"""
+        GoogleCalendarIngester().publish_plan(day or self.day)
+
+    @timed("builder.plan_range")
+    def plan_range(self, start_date: date, end_date: date) -> list[Day]:
+        """plan every work day from start_date to end_date (inclusive) in one pass.
+
+        Busy times for the whole range come from one calendar call and the
+        tasks are read once. Days are filled in order with the most urgent
+        tasks first; whatever does not fit (including whole partial groups)
+        carries forward to the next day. Each day's plan is saved.
+        """
+        gci = GoogleCalendarIngester()
+        busy = self._normalize_busy(gci.get_busy_for_range(start_date, end_date))
+        tasks = Task.get_tasks()
+        store = PlanStore()
+        days = []
+        day = start_date
+        while day <= end_date:
+            if day.weekday() in self.settings.work_days:
+                day_start, day_end = self._day_bounds(day)
+                plan = self._build_day(day, [b for b in busy if b.start < day_end and b.end > day_start])
+                tasks = self._assign_tasks_to_blocks(tasks, plan)
+                store.save(plan)
+                days.append(plan)
+            day += timedelta(days=1)
+        if tasks:
+            logger.warning(f"{len(tasks)} tasks did not fit before {end_date}")
+        return days
+
+    def _day_bounds(self, day: date) -> tuple[datetime, datetime]:
+        return (datetime.combine(day, time.fromisoformat(self.settings.start_time)),
+                datetime.combine(day, time.fromisoformat(self.settings.end_time)))
+
+    @timed("builder.build_day")
+    def _build_day(self, day: date, busy: list) -> Day:
+        """lay out a day's blocks around its busy times, including lunch"""
+        gaps = self._get_spaces_between_existing_events(*self._day_bounds(day), self._normalize_busy(busy))
+        return Day(day, blocks=self._layout_gaps(day, gaps))
+
+    @staticmethod
+    def _normalize_busy(busy: list) -> list[BusyRange]:
+        """calendar ranges as naive local times, like the rest of the plan"""
+        def local(moment: datetime) -> datetime:
+            return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+        return [BusyRange(start=local(b.start), end=local(b.end)) for b in busy]
 
 
     @classmethod
     def _get_spaces_between_existing_events(cls, day_start: datetime, day_end: datetime, existing_events: list) -> list:
-        """find all the spaces between existing events"""
-        ordered_events = sorted(existing_events, key=lambda x: x.start)
-        pointer = day_start
-        gaps = []
-
-        for event in ordered_events:
-            if event.start > pointer:
-                gap = Gap(start=pointer,
-                    end=event.start,
-                    duration=(event.start-pointer).minutes)
-                gaps.append(gap)
-                pointer = event.end
-        if pointer < day_end:
-            gap = Gap(start=pointer,
-                end=day_end,
-                duration=(day_end-pointer).minutes)
-            gaps.append(gap)
-        return gaps
-
-    def _next_biggest_block(cls,
-                          gap: Gap,
-                          block_list: list[Block],
-                          blocks:list) -> list[Block]:
-        """recursively stack the bins"""
-        if not block_list:
-            return blocks
-        next_block = block_list.pop(0)
-        count = next_block.total_duration // gap.duration
-        remainder = next_block.total_duration % gap.duration
-        for i in range(count):
-            start = gap.start + (i * next_block.total_duration)
-            end = start + next_block.total_duration
-            blocks.append(next_block(start=start,
-                                     index=len(blocks),
-                                     end=end))
-        if remainder:
-            gap = Gap(start=end,
-                      end=gap.end,
-                      duration=remainder)
-            return cls._next_biggest_block(gap, block_list, blocks)
-
-    def _set_lunch_block(self):
-        """set the lunch block"""
-        ideal_lunch_start = datetime.combine(self.date, self.settings.lunch_aprox_start)
-        lunch_sized_blocks = [b for b in self.blocks if b.size == self.settings.lunch_size]
-        if not lunch_sized_blocks:
-            logger.error("No lunch sized blocks available. That sucks.")
-            return
-        lunch_block = lunch_sized_blocks[0]
-        for block in lunch_sized_blocks:
-            current_delta = abs(lunch_block.start - ideal_lunch_start)
-            distance_from_ideal = abs(block.start - ideal_lunch_start)
-            if distance_from_ideal < current_delta:
-                lunch_block = block
-        lunch_block.add_task(
+        """find all the spaces between existing events, merging overlapping ones first"""
+        return [Gap(start=free.start, end=free.end, duration=free.length.total_seconds() // 60)
+                for free in intervals.complement(intervals.normalize(existing_events), day_start, day_end)]
+
+    def common_focus_time(self,
+                          people: list[str],
+                          start_date: date,
+                          end_date: date,
+                          minimum: int | None = None) -> list[Gap]:
+        """the working hours from start_date to end_date (inclusive) when everyone is free.
+
+        `people` are calendar ids (emails) that share at least their
+        free/busy with us; our own calendars are always included. Only
+        stretches of at least `minimum` minutes, a big block by default,
+        are returned.
+        """
+        gci = GoogleCalendarIngester()
+        calendars = gci.get_busy_by_calendar(start_date, end_date)
+        calendars.update(gci.get_busy_by_calendar(start_date, end_date, calendar_ids=people))
+        windows = []
+        day = start_date
+        while day <= end_date:
+            if day.weekday() in self.settings.work_days:
+                windows.append(intervals.Interval(*self._day_bounds(day)))
+            day += timedelta(days=1)
+        minimum = self.settings.big_block_size if minimum is None else minimum
+        free = intervals.common_free((self._normalize_busy(c) for c in calendars.values()),
+                                     windows,
+                                     minimum=timedelta(minutes=minimum))
+        return [Gap(start=f.start, end=f.end, duration=f.length.total_seconds() // 60) for f in free]
+
+    @classmethod
+    def _block_specs(cls) -> tuple[layout.BlockSpec, ...]:
+        return tuple(layout.BlockSpec(duration=b.model_fields["duration"].default,
+                                      break_size=b.model_fields["break_size"].default,
+                                      points=b.model_fields["max_points"].default)
+                     for b in cls.block_types)
+
+    @classmethod
+    def _layout_gap(cls, gap: Gap, first_index: int = 0) -> list[Block]:
+        """lay out the blocks (and the breaks between them) that fit the most points in a gap"""
+        blocks = []
+        pointer = gap.start
+        for i in layout.solve(gap.duration, cls._block_specs()):
+            block_type = cls.block_types[i]
+            block = block_type(start=pointer,
+                               end=pointer + timedelta(minutes=block_type.model_fields["duration"].default),
+                               index=first_index + len(blocks))
+            blocks.append(block)
+            pointer = block.end + timedelta(minutes=block.break_size)
+        return blocks
+
+    def _layout_gaps(self, day: date, gaps: list[Gap], first_index: int = 0, lunch: bool = True) -> list[Block]:
+        """lay out a day's gaps in order, with lunch reserved first so the blocks are solved around it"""
+        lunch_block = self._lunch_block(day, gaps) if lunch and self.settings.lunch else None
+        if lunch_block:
+            gaps = self._without(gaps, lunch_block.start, lunch_block.end + timedelta(minutes=lunch_block.break_size))
+        blocks = []
+        for gap in gaps:
+            if lunch_block and lunch_block.start < gap.start and lunch_block not in blocks:
+                lunch_block.index = first_index + len(blocks)
+                blocks.append(lunch_block)
+            blocks.extend(self._layout_gap(gap, first_index=first_index + len(blocks)))
+        if lunch_block and lunch_block not in blocks:
+            lunch_block.index = first_index + len(blocks)
+            blocks.append(lunch_block)
+        return blocks
+
+    def _lunch_block(self, day: date, gaps: list[Gap]) -> Block | None:
+        """a lunch sized block holding lunch, in the free time nearest lunch_aprox_start"""
+        block_type = next(b for b in self.block_types if b.model_fields["size"].default == self.settings.lunch_size)
+        duration = timedelta(minutes=block_type.model_fields["duration"].default)
+        ideal = datetime.combine(day, time.fromisoformat(self.settings.lunch_aprox_start))
+        starts = [min(max(ideal, gap.start), gap.end - duration) for gap in gaps if gap.end - gap.start >= duration]
+        if not starts:
+            logger.error("No room for a lunch sized block. That sucks.")
+            return None
+        start = min(starts, key=lambda s: abs(s - ideal))
+        block = block_type(start=start, end=start + duration, index=0)
+        block.add_task(
             Task(description="Lunch",
-                 entry=lunch_block.start,
+                 entry=block.start,
                  status="pending",
+                 uuid=str(uuid.uuid4()),
                  points=block.max_points,
                  tags=["lunch"]))
+        return block
 
-    @classmethod
-    def _assign_tasks_to_blocks(cls,
+    @staticmethod
+    def _without(gaps: list[Gap], start: datetime, end: datetime) -> list[Gap]:
+        """the gaps with start to end taken out"""
+        return [Gap(start=piece.start, end=piece.end, duration=piece.length.total_seconds() // 60)
+                for gap in gaps
+                for piece in intervals.complement([intervals.Interval(start, end)], gap.start, gap.end)]
+
+    @timed("builder.pack")
+    def _assign_tasks_to_blocks(self,
                                 tasks: list[Task],
-                                day: Day):
-        """do the actual bin packing"""
-        # break tasks into stacks of 10 by priority
-        task_groups = [
-            task[n*10:][:10] for n in
-                range((len(tasks)//10) + 1)
-        ]
-        for group in task_groups:
-            partial_ids = set([t.partial_group for t in group])
-            for partial_id in partial_ids:
-                partials = [t for t in group if t.partial_group == partial_id]
-                cls._assign_partials(partials, day)
-                group -= partials
-            group = sorted(group, key=lambda x: x.points, reverse=True)
-            for task in group:
-                block = day.most_space_available_block()
-                if block.can_fit(task):
-                    block.add_task(task)
-                    logger.info(f"added {task.description} to block {block.index}")
-                else:
-                    logger.error(f"Could not fit {task.description} into any block")
-
-    def _assign_partials(cls,
-                         partials:list[Task],
-                         day:Day) -> None:
-        """assign partials to blocks or fail to do so if there's no room"""
-        contiguous_blocks = len(partials)
-        first_block = day.most_space_available_block()
-        block = first_block
-        # check there's enough room for all the partials
-        for i in range(contiguous_blocks):
-            if not block or not block.can_fit(partials[i]):
-                logger.error(f"Not enough room for partials tasks {partials[i].description}")
-                return
-            block = day.next_block(block)
-        # there's enough room, so assign them
-        block = first_block
-        for i in range(contiguous_blocks):
-            block.add_task(partials[i])
-            block = day.next_block(block)
-        logger.info(f"added complete partials to blocks for {partials[-1].description}")
\ No newline at end of file
+                                day: Day) -> list[Task]:
+        """do the actual bin packing, returning the tasks that did not fit"""
+        packer = Packer(strategy=self.settings.packing_strategy,
+                        time_budget=self.settings.packing_time_budget)
+        return packer.pack(tasks, day.blocks)
@@ -0,0 +1,86 @@
+import json
+import time
+from datetime import date, datetime
+from pathlib import Path
+from logging import getLogger
+
+from gcsa.free_busy import TimeRange
+
+logger = getLogger(__name__)
+
+
+class BusyCache:
+    """On-disk cache of busy ranges, keyed by calendar id and date.
+
+    Entries go stale after `ttl` seconds. Each calendar can also carry an
+    events sync token, which lets the ingester ask Google whether anything
+    changed before throwing stale entries away.
+    """
+
+    def __init__(self, path: str | Path, ttl: int = 900):
+        self.path = Path(path).expanduser()
+        self.ttl = ttl
+        self.data: dict = {"calendar_ids": None, "calendars": {}}
+        if self.path.exists():
+            try:
+                self.data = json.loads(self.path.read_text())
+            except ValueError:
+                logger.warning("Ignoring unreadable calendar cache at %s", self.path)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data))
+        tmp.replace(self.path)
+
+    def _fresh(self, fetched: float) -> bool:
+        return time.time() - fetched < self.ttl
+
+    def _calendar(self, calendar_id: str) -> dict:
+        return self.data["calendars"].setdefault(calendar_id, {"sync_token": None, "days": {}})
+
+    def calendar_ids(self) -> list[str] | None:
+        """the cached calendar list, None if missing or stale"""
+        cached = self.data.get("calendar_ids")
+        if cached and self._fresh(cached["fetched"]):
+            return cached["ids"]
+        return None
+
+    def set_calendar_ids(self, ids: list[str]) -> None:
+        self.data["calendar_ids"] = {"fetched": time.time(), "ids": ids}
+
+    def get(self, calendar_id: str, day: date) -> list[TimeRange] | None:
+        """busy ranges for a calendar on a day, None if not cached or stale"""
+        entry = self._calendar(calendar_id)["days"].get(day.isoformat())
+        if entry is None or not self._fresh(entry["fetched"]):
+            return None
+        return [TimeRange(datetime.fromisoformat(s), datetime.fromisoformat(e)) for s, e in entry["busy"]]
+
+    def put(self, calendar_id: str, day: date, ranges: list[TimeRange]) -> None:
+        self._calendar(calendar_id)["days"][day.isoformat()] = {
+            "fetched": time.time(),
+            "busy": [[r.start.isoformat(), r.end.isoformat()] for r in ranges],
+        }
+
+    def stale(self, calendar_id: str, days: list[date]) -> list[date]:
+        """the days that are cached for a calendar but past their ttl"""
+        entries = self._calendar(calendar_id)["days"]
+        return [d for d in days
+                if d.isoformat() in entries and not self._fresh(entries[d.isoformat()]["fetched"])]
+
+    def touch(self, calendar_id: str, days: list[date]) -> None:
+        """mark cached days as confirmed unchanged"""
+        entries = self._calendar(calendar_id)["days"]
+        for day in days:
+            if day.isoformat() in entries:
+                entries[day.isoformat()]["fetched"] = time.time()
+
+    def invalidate(self, calendar_id: str) -> None:
+        self._calendar(calendar_id)["days"] = {}
+
+    def sync_token(self, calendar_id: str) -> str | None:
+        """the events sync token, "" if the calendar cannot be synced"""
+        return self._calendar(calendar_id)["sync_token"]
+
+    def set_sync_token(self, calendar_id: str, token: str | None) -> None:
+        self._calendar(calendar_id)["sync_token"] = token
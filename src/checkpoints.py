@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+from logging import getLogger
+from pydantic import BaseModel
+
+logger = getLogger(__name__)
+
+
+class Checkpoint(BaseModel):
+    """how far a mailbox folder has been read"""
+    uidvalidity: int
+    uid: int
+
+
+class CheckpointStore:
+    """Last seen UIDVALIDITY and UID per account folder, persisted as JSON."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self._checkpoints: dict[str, Checkpoint] = {}
+        if self.path.exists():
+            try:
+                self._checkpoints = {k: Checkpoint(**v) for k, v in json.loads(self.path.read_text()).items()}
+            except ValueError:
+                logger.warning("Ignoring unreadable checkpoints at %s", self.path)
+
+    def get(self, key: str) -> Checkpoint | None:
+        return self._checkpoints.get(key)
+
+    def store(self, key: str, checkpoint: Checkpoint) -> None:
+        self._checkpoints[key] = checkpoint
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({k: v.model_dump() for k, v in self._checkpoints.items()}))
+        tmp.replace(self.path)
@@ -1,19 +1,217 @@
 import time
 import click
 
-from .slacker import Slacker
+@click.group()
+@click.option("--profile", is_flag=True, help="Log timing spans and print a per-stage breakdown on exit.")
+@click.pass_context
+def main(ctx: click.Context, profile: bool):
+    """Singularity command line"""
+    if profile:
+        enable_profiling(ctx)
 
-@click.command()
+@main.command("slack")
 @click.option("--wait", default=0, help="Wait for this many seconds before updating.")
 def update_slack_status(wait: int):
+    """update slack status from the active taskwarrior tasks"""
     if wait:
         click.echo(f"Waiting {wait} seconds before updating...")
         time.sleep(wait)
         click.echo("Done waiting.")
     click.echo("Updating slack status based on current taskwarrior tasks...")
+    from .slacker import Slacker
     client = Slacker()
     client.update_statuses_based_on_current_state()
     click.echo("Updated.")
 
+@main.command()
+@click.option("--members", "members_path", default=None, help="JSON file of team members.")
+def team(members_path: str | None):
+    """update the slack status of every team member from their tasks"""
+    from .team import Team
+    members = Team.load(members_path)
+    click.echo(f"Updating {len(members.members)} team members...")
+    errors = members.sync()
+    for user_id, error in errors.items():
+        click.echo(f"  {user_id}: {error}")
+    click.echo(f"Updated {len(members.members) - len(errors)} of {len(members.members)}.")
+
+@main.command()
+@click.option("--socket", "socket_path", default=None, help="Unix socket to listen on.")
+@click.option("--debounce", default=None, type=float, help="Quiet seconds to wait for a burst of changes to settle.")
+def daemon(socket_path: str | None, debounce: float | None):
+    """keep a Slack sync service running for the taskwarrior hook"""
+    from .daemon import SyncDaemon
+    from .settings import CommonSettings
+    settings = CommonSettings()
+    socket_path = socket_path or settings.socket_path
+    debounce = settings.debounce_seconds if debounce is None else debounce
+    with SyncDaemon(socket_path, debounce=debounce) as server:
+        click.echo(f"Listening on {server.socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            click.echo("Shutting down.")
+
+@main.command()
+@click.option("--folder", default=None, help="Mailbox folder to watch, defaults to All Mail.")
+@click.option("--rules", "rules_path", default=None, help="JSON file of email rules.")
+def watch(folder: str | None, rules_path: str | None):
+    """turn new email into taskwarrior tasks as it arrives"""
+    from .watcher import MailWatcher, RuleSet
+    watcher = MailWatcher(rules=RuleSet.load(rules_path), folder=folder)
+    click.echo(f"Watching {watcher.folder} with {len(watcher.rules.rules)} rules")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        click.echo("Shutting down.")
+
+@main.command()
+@click.option("--start", "start_date", default=None, help="First day to plan (YYYY-MM-DD), defaults to today.")
+@click.option("--days", default=7, help="Number of days to plan.")
+def plan(start_date: str | None, days: int):
+    """plan the blocks and tasks for a range of days"""
+    from datetime import date, timedelta
+    from .builder import Builder
+    start = date.fromisoformat(start_date) if start_date else date.today()
+    for day in Builder(start).plan_range(start, start + timedelta(days=days - 1)):
+        echo_day(day)
+    notify_daemon(date.today())
+
+@main.command()
+@click.option("--day", default=None, help="Day to replan (YYYY-MM-DD), defaults to today.")
+def replan(day: str | None):
+    """update the saved plan for a day after calendar or task changes"""
+    from datetime import date
+    from .replanner import Replanner
+    plan = Replanner().replan(date.fromisoformat(day) if day else date.today())
+    echo_day(plan)
+    notify_daemon(plan.date)
+
+@main.command()
+@click.argument("people", nargs=-1, required=True)
+@click.option("--start", "start_date", default=None, help="First day to search (YYYY-MM-DD), defaults to today.")
+@click.option("--days", default=5, help="Number of days to search.")
+@click.option("--minutes", default=None, type=int, help="Shortest useful stretch, defaults to a big block.")
+def focus(people: tuple[str, ...], start_date: str | None, days: int, minutes: int | None):
+    """find working hours when you and PEOPLE (calendar emails) are all free"""
+    from datetime import date, timedelta
+    from .builder import Builder
+    start = date.fromisoformat(start_date) if start_date else date.today()
+    gaps = Builder(start).common_focus_time(list(people), start, start + timedelta(days=days - 1), minimum=minutes)
+    if not gaps:
+        click.echo("No common focus time found.")
+    for gap in gaps:
+        click.echo(f"{gap.start:%a %Y-%m-%d %H:%M}-{gap.end:%H:%M} ({gap.duration} min)")
+
+@main.command()
+@click.option("--tasks", default="10,100,1000,10000", help="Comma separated task counts.")
+@click.option("--meetings", default="0,10,50", help="Comma separated meetings per day.")
+@click.option("--days", default=5, help="Days planned per case.")
+@click.option("--repeat", default=3, help="Runs per stage, the best is kept.")
+@click.option("--save-baseline", is_flag=True, help="Store these results as the new baseline.")
+@click.option("--tolerance", default=0.25, help="Allowed slowdown against the baseline.")
+def bench(tasks: str, meetings: str, days: int, repeat: int, save_baseline: bool, tolerance: float):
+    """benchmark planning on synthetic tasks and calendars"""
+    from . import benchmark
+    results = benchmark.run([int(n) for n in tasks.split(",")],
+                            [int(n) for n in meetings.split(",")],
+                            days=days,
+                            repeat=repeat)
+    click.echo(f"{'case':>14} " + " ".join(f"{s:>9}" for s in benchmark.STAGES)
+               + f" {'peak KiB':>9} {'util':>5} {'frag':>5} {'unplaced':>8}")
+    for r in results:
+        click.echo(f"{r.key:>14} " + " ".join(f"{r.stages[s].seconds * 1000:>7.1f}ms" for s in benchmark.STAGES)
+                   + f" {max(s.peak_kib for s in r.stages.values()):>9.0f} {r.utilization:>5.2f}"
+                   f" {r.fragmentation:>5.2f} {r.unplaced:>8}")
+    if save_baseline:
+        benchmark.save_baseline(results)
+        click.echo(f"Saved baseline to {benchmark.baseline_path()}")
+        return
+    regressions = benchmark.compare(results, tolerance=tolerance)
+    for regression in regressions:
+        click.echo(f"REGRESSION {regression}")
+    if regressions:
+        raise SystemExit(1)
+
+@main.command()
+@click.option("--mode", type=click.Choice(["daemon", "oneshot"]), default="daemon",
+              help="Hand events to the sync daemon, or start `slack --wait` per event like the fallback.")
+@click.option("--events", "events_path", default=None, help="Recorded events (json lines of old, new, delay).")
+@click.option("--bursts", default=20, help="Synthetic bursts to play.")
+@click.option("--burst-size", default=3, help="Most events in a synthetic burst.")
+@click.option("--debounce", default=None, type=float, help="Daemon debounce, defaults to the setting.")
+@click.option("--wait", default=0, help="The --wait given to `slack` in oneshot mode.")
+@click.option("--slack-latency", default=0.05, help="Seconds the fake Slack API takes per call.")
+@click.option("--seed", default=0)
+def replay(mode: str, events_path: str | None, bursts: int, burst_size: int, debounce: float | None,
+           wait: int, slack_latency: float, seed: int):
+    """time on-modify events through to the Slack status against local stand-ins"""
+    from . import replay
+    from .settings import CommonSettings
+    if events_path:
+        records, stream = replay.load_events(events_path)
+    else:
+        records, stream = replay.synthetic_events(bursts=bursts, burst_size=burst_size, seed=seed)
+    debounce = CommonSettings().debounce_seconds if debounce is None else debounce
+    report = replay.Replay(mode, debounce=debounce, wait=wait, slack_latency=slack_latency).run(records, stream)
+
+    def ms(seconds: float | None) -> str:
+        return "n/a" if seconds is None else f"{seconds * 1000:.0f}ms"
+    click.echo(f"{mode}: {sum(b.events for b in report.bursts)} events in {len(report.bursts)} bursts")
+    click.echo(f"  to final status  p50 {ms(report.percentile(50))}  p95 {ms(report.percentile(95))}"
+               f"  p99 {ms(report.percentile(99))}")
+    click.echo(f"  hook             p50 {ms(report.hook_percentile(50))}  p95 {ms(report.hook_percentile(95))}")
+    click.echo(f"  writes {sum(b.writes for b in report.bursts)}, {report.redundant_writes} redundant,"
+               f" reads {sum(b.reads for b in report.bursts)}, rate limited {report.rate_limited}")
+    click.echo(f"  wrong final status in {report.wrong} of {len(report.bursts)} bursts"
+               f" ({report.wrong / max(len(report.bursts), 1):.0%})")
+
+@main.command("startup-check")
+@click.option("--path", type=click.Choice(["hook", "slack"]), default="hook",
+              help="Time the hook handing a change to the daemon, or the `slack` command's fallback path.")
+@click.option("--budget", default=100.0, help="Milliseconds allowed for the path.")
+@click.option("--runs", default=5, help="Fresh interpreters to time, the best is kept.")
+def startup_check(path: str, budget: float, runs: int):
+    """check that a task change gets out of taskwarrior's way within the startup budget"""
+    from .startup import measure, measure_hook
+    try:
+        report = measure_hook(runs=runs) if path == "hook" else measure(runs=runs)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    label = "hook handed off to the daemon" if path == "hook" else "slack command ready"
+    click.echo(f"{label} in {report.seconds * 1000:.1f}ms (budget {budget:.0f}ms)")
+    for name, ms in report.imports:
+        click.echo(f"  {ms:>7.1f}ms {name}")
+    if report.over(budget):
+        raise SystemExit(1)
+
+def enable_profiling(ctx: click.Context) -> None:
+    """json span logs on stderr, and the totals once the command finishes"""
+    import logging
+    from . import timing
+    # cpu spent before the command runs is mostly interpreter start and imports
+    startup = time.process_time()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    timing.logger.addHandler(handler)
+    timing.logger.setLevel(logging.DEBUG)
+    timing.start_profile(startup)
+    ctx.call_on_close(lambda: click.echo(timing.stop_profile().report(), err=True))
+
+def notify_daemon(day) -> None:
+    """let a running daemon reschedule around the new plan"""
+    from .daemon import notify_plan_changed
+    from .settings import CommonSettings
+    if notify_plan_changed(CommonSettings().socket_path, day):
+        click.echo("Daemon rescheduled.")
+
+def echo_day(day) -> None:
+    from .models import BlockSize
+    click.echo(day.date.strftime("%A %Y-%m-%d"))
+    for block in day.blocks:
+        tasks = ", ".join(t.description for t in block.tasks) or "-"
+        click.echo(f"  {block.start:%H:%M}-{block.end:%H:%M} {block.name} "
+                   f"({BlockSize(block.size).value} {block.used_points}/{block.max_points}): {tasks}")
+
 if __name__ == "__main__":
-    update_slack_status()
+    main()
@@ -0,0 +1,101 @@
+import os
+import json
+import socket
+import socketserver
+from datetime import date
+from pathlib import Path
+from functools import partial
+from logging import getLogger
+
+from .scheduler import Scheduler
+from .slacker import Slacker
+from .update_queue import UpdateQueue
+
+logger = getLogger(__name__)
+
+
+def notify_plan_changed(socket_path: str | Path, day: date) -> bool:
+    """tell a running daemon that the plan for `day` was saved, False if none is listening"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(0.5)
+            conn.connect(str(Path(socket_path).expanduser()))
+            conn.sendall(f"{json.dumps({'reload': day.isoformat()})}\n".encode())
+            return conn.recv(16).startswith(b"ok")
+    except OSError:
+        return False
+
+
+class HookHandler(socketserver.StreamRequestHandler):
+    """read one old/new task pair written by the on-modify hook, or a plan reload notice"""
+
+    def handle(self):
+        try:
+            old = json.loads(self.rfile.readline())
+            if "reload" in old:
+                self.server.reload(date.fromisoformat(old["reload"]))
+                self.wfile.write(b"ok\n")
+                return
+            new = json.loads(self.rfile.readline())
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error("Malformed hook payload: %s", e)
+            self.wfile.write(b"error\n")
+            return
+        self.server.submit(old, new)
+        self.wfile.write(b"ok\n")
+
+
+class SyncDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A long running Slack sync service listening on a local unix socket.
+
+    Keeps a single warm `Slacker` (and its `WebClient`) for the life of the
+    process so each hook only pays for a socket write. Start/stop bursts are
+    debounced into one update by an `UpdateQueue`. A `Scheduler` changes the
+    status at the plan's block, break and lunch boundaries in between.
+    """
+    daemon_threads = True
+
+    def __init__(self,
+                 socket_path: str | Path,
+                 slacker: Slacker | None = None,
+                 debounce: float = 1.0,
+                 scheduler: Scheduler | None = None):
+        self.socket_path = Path(socket_path).expanduser()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self.slacker = slacker or Slacker()
+        self.queue = UpdateQueue(self.update, debounce=debounce)
+        self.scheduler = scheduler or Scheduler(self.slacker)
+        self.scheduler.start()
+        super().__init__(str(self.socket_path), HookHandler)
+        os.chmod(self.socket_path, 0o600)
+
+    @staticmethod
+    def state_changed(old: dict, new: dict) -> bool:
+        return old.get("start") != new.get("start")
+
+    def submit(self, old: dict, new: dict) -> None:
+        """schedule a status update if the task was started or stopped"""
+        if not self.state_changed(old, new):
+            logger.info("No change needed for %s", new.get("description"))
+            return
+        self.queue.put(new)
+
+    def update(self, changed: dict[str, dict], generation: int) -> None:
+        try:
+            self.slacker.update_statuses_based_on_current_state(
+                changed=changed,
+                is_current=partial(self.queue.is_current, generation))
+        except ValueError as e:
+            logger.error("Failed to update Slack status: %s", e)
+
+    def reload(self, day: date) -> None:
+        """reschedule after `plan` or `replan` saved a new plan for `day`"""
+        if day == date.today():
+            self.scheduler.reload(day)
+
+    def server_close(self):
+        self.scheduler.stop()
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+from .settings import CommonSettings
+
+if TYPE_CHECKING:
+    from .pipeline import IngestItem
+
+logger = getLogger(__name__)
+
+
+def content_hash(item: "IngestItem") -> str:
+    """hash of everything about an item that ends up in its task"""
+    content = [item.title, item.body, sorted(item.tags), item.points, item.project]
+    return hashlib.sha1(json.dumps(content).encode()).hexdigest()
+
+
+class DedupeIndex:
+    """Which ingested items already became tasks, kept in SQLite.
+
+    Each (source, source id) maps to the hash of its content and the uuid of
+    its task, so an ingest run can check a whole batch with a few primary key
+    lookups instead of scanning pending tasks, and record it with one upsert.
+    """
+    # stay under sqlite's default limit of 999 bound parameters
+    CHUNK = 400
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or Path(CommonSettings().state_dir) / "dedupe.sqlite3").expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS items (
+                               source TEXT NOT NULL,
+                               source_id TEXT NOT NULL,
+                               hash TEXT NOT NULL,
+                               uuid TEXT NOT NULL,
+                               seen REAL NOT NULL,
+                               PRIMARY KEY (source, source_id)
+                           ) WITHOUT ROWID""")
+        self.db.commit()
+
+    def get(self, source: str, source_id: str) -> tuple[str, str] | None:
+        """the content hash and task uuid recorded for an item"""
+        return self.db.execute("SELECT hash, uuid FROM items WHERE source = ? AND source_id = ?",
+                               (source, source_id)).fetchone()
+
+    def hashes(self, items: list["IngestItem"]) -> dict[tuple[str, str], str]:
+        """recorded content hashes for the items that have one"""
+        found = {}
+        for n in range(0, len(items), self.CHUNK):
+            chunk = items[n:n + self.CHUNK]
+            rows = self.db.execute(
+                "SELECT source, source_id, hash FROM items WHERE (source, source_id) IN (VALUES "
+                + ",".join("(?, ?)" for _ in chunk) + ")",
+                [value for item in chunk for value in (item.source, item.source_id)])
+            found.update({(source, source_id): hash for source, source_id, hash in rows})
+        return found
+
+    def changes(self, items: list["IngestItem"]) -> tuple[list["IngestItem"], list["IngestItem"]]:
+        """the items never recorded, and the recorded ones whose content changed since"""
+        hashes = self.hashes(items)
+        new, changed = [], []
+        for item in items:
+            recorded = hashes.get((item.source, item.source_id))
+            if recorded is None:
+                new.append(item)
+            elif recorded != content_hash(item):
+                changed.append(item)
+        return new, changed
+
+    def upsert(self, items: list["IngestItem"]) -> None:
+        """record items as filed, in one transaction"""
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                """INSERT INTO items (source, source_id, hash, uuid, seen) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (source, source_id) DO UPDATE SET hash = excluded.hash, seen = excluded.seen""",
+                [(i.source, i.source_id, content_hash(i), i.uuid, now) for i in items])
+        logger.debug("Recorded %s ingested items", len(items))
+
+    def close(self) -> None:
+        self.db.close()
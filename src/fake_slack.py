@@ -0,0 +1,164 @@
+import json
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import monotonic, sleep, time
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlsplit
+from logging import getLogger
+
+from .ratelimit import DEFAULT_LIMIT, METHOD_LIMITS
+
+logger = getLogger(__name__)
+
+
+class Call(NamedTuple):
+    at: float
+    method: str
+    user: str | None
+    params: dict
+    status: int
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    """answer Web API calls from the fake's in memory state"""
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        if length := int(self.headers.get("Content-Length") or 0):
+            body = self.rfile.read(length).decode()
+            if "json" in self.headers.get("Content-Type", ""):
+                params.update(json.loads(body))
+            else:
+                params.update(parse_qsl(body))
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        status, payload, headers = self.server.slack.call(url.path.rsplit("/", 1)[-1], token, params)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class FakeSlack:
+    """A local stand in for the handful of Slack Web API methods the status sync uses.
+
+    Keeps each user's profile status, DND and presence in memory, records
+    every call, and answers 429 with a Retry-After once a method goes over
+    its per minute limit, like Slack does. Point a `WebClient` at `base_url`
+    to use it, e.g. from the replay harness or to try out a team's fan-out.
+    """
+
+    def __init__(self,
+                 users: dict[str, str] | None = None,
+                 latency: float = 0.0,
+                 limits: dict[str, int] | None = None,
+                 port: int = 0):
+        self.tokens = dict(users or {})
+        self.latency = latency
+        self.limits = limits or METHOD_LIMITS
+        self.calls: list[Call] = []
+        self.profiles: dict[str, dict] = defaultdict(lambda: {"status_text": "", "status_emoji": "",
+                                                                "status_expiration": 0})
+        self.snoozes: dict[str, float] = {}
+        self.away: dict[str, bool] = defaultdict(bool)
+        self._recent: dict[str, deque] = defaultdict(deque)
+        self._lock = Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), FakeSlackHandler)
+        self.server.daemon_threads = True
+        self.server.slack = self
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/api/"
+
+    def add_user(self, token: str, user_id: str) -> None:
+        self.tokens[token] = user_id
+
+    def start(self) -> "FakeSlack":
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeSlack":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def status(self, user_id: str) -> dict:
+        """what a teammate would see for `user_id` right now"""
+        with self._lock:
+            return {**self.profiles[user_id],
+                    "dnd": self.snoozes.get(user_id, 0) > time(),
+                    "away": self.away[user_id]}
+
+    def count(self, method: str | None = None, status: int | None = None) -> int:
+        return sum(1 for c in self.calls
+                   if (method is None or c.method == method) and (status is None or c.status == status))
+
+    def call(self, method: str, token: str, params: dict) -> tuple[int, dict, dict]:
+        if self.latency:
+            sleep(self.latency)
+        with self._lock:
+            user = self.tokens.get(token)
+            if user is None:
+                return self._record(method, user, params, 200, {"ok": False, "error": "invalid_auth"})
+            now = monotonic()
+            recent = self._recent[method]
+            while recent and recent[0] <= now - 60:
+                recent.popleft()
+            if len(recent) >= self.limits.get(method, DEFAULT_LIMIT):
+                retry_after = int(recent[0] + 60 - now) + 1
+                return self._record(method, user, params, 429, {"ok": False, "error": "ratelimited"},
+                                    {"Retry-After": str(retry_after)})
+            recent.append(now)
+            return self._record(method, user, params, 200, self._answer(method, user, params))
+
+    def _record(self, method, user, params, status, payload, headers=None) -> tuple[int, dict, dict]:
+        self.calls.append(Call(monotonic(), method, user, params, status))
+        return status, payload, headers or {}
+
+    def _answer(self, method: str, user: str, params: dict) -> dict:
+        target = params.get("user") or user
+        if method == "users.profile.get":
+            return {"ok": True, "profile": dict(self.profiles[target])}
+        if method == "users.profile.set":
+            profile = params.get("profile") or {}
+            if isinstance(profile, str):
+                profile = json.loads(profile)
+            self.profiles[user].update({k: v for k, v in profile.items() if k in self.profiles[user]})
+            return {"ok": True, "profile": dict(self.profiles[user])}
+        if method == "dnd.info":
+            end = self.snoozes.get(target, 0)
+            snoozed = end > time()
+            return {"ok": True, "snooze_enabled": snoozed, **({"snooze_endtime": int(end)} if snoozed else {})}
+        if method == "dnd.setSnooze":
+            self.snoozes[user] = time() + float(params["num_minutes"]) * 60
+            return {"ok": True, "snooze_enabled": True, "snooze_endtime": int(self.snoozes[user])}
+        if method == "dnd.endSnooze":
+            self.snoozes.pop(user, None)
+            return {"ok": True, "snooze_enabled": False}
+        if method == "users.getPresence":
+            away = self.away[target]
+            return {"ok": True, "presence": "away" if away else "active", "manual_away": away}
+        if method == "users.setPresence":
+            self.away[user] = params.get("presence") == "away"
+            return {"ok": True}
+        return {"ok": False, "error": "unknown_method"}
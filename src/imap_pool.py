@@ -0,0 +1,192 @@
+import time
+from contextlib import contextmanager
+from imaplib import IMAP4
+from logging import getLogger
+from threading import Condition, Thread
+from typing import Callable, Iterator, TYPE_CHECKING
+
+from imap_tools import MailBox
+
+from .settings import ImapSettings
+from .timing import span
+
+if TYPE_CHECKING:
+    from .ingester import Credentials
+
+logger = getLogger(__name__)
+
+CONNECTION_ERRORS = (IMAP4.error, OSError)
+
+
+class Session:
+    """one logged in mailbox and when it was last known to be healthy"""
+    __slots__ = ("mailbox", "last_used")
+
+    def __init__(self, mailbox: MailBox):
+        self.mailbox = mailbox
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """Keeps authenticated IMAP sessions alive and hands them out per account.
+
+    Idle sessions are kept warm with NOOP by a background thread and closed
+    after `idle_timeout`. A session that sat idle is checked with NOOP before
+    it is handed out; dead ones are replaced. Logins retry with exponential
+    backoff. Each account (host, port, user) gets at most `max_size` sessions
+    and callers wait for one to come back when all are busy.
+    """
+    _default: "ConnectionPool | None" = None
+
+    def __init__(self,
+                 max_size: int = 4,
+                 keepalive: float = 300,
+                 idle_timeout: float = 1500,
+                 max_retries: int = 4,
+                 mailbox_factory: Callable[[str, int], MailBox] = MailBox):
+        self.max_size = max_size
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.mailbox_factory = mailbox_factory
+        self._idle: dict[tuple, list[Session]] = {}
+        self._in_use: dict[tuple, int] = {}
+        self._cond = Condition()
+        self._closed = False
+        Thread(target=self._keep_alive, daemon=True).start()
+
+    @classmethod
+    def default(cls) -> "ConnectionPool":
+        """the process wide pool"""
+        if cls._default is None:
+            settings = ImapSettings()
+            cls._default = cls(max_size=settings.imap_pool_size,
+                               keepalive=settings.imap_keepalive,
+                               idle_timeout=settings.imap_idle_timeout)
+        return cls._default
+
+    @staticmethod
+    def _key(credentials: "Credentials") -> tuple:
+        return (credentials.host, int(credentials.port), credentials.username)
+
+    @contextmanager
+    def session(self, credentials: "Credentials") -> Iterator[MailBox]:
+        mailbox = self.acquire(credentials)
+        try:
+            yield mailbox
+        except CONNECTION_ERRORS:
+            self.release(credentials, mailbox, broken=True)
+            raise
+        except BaseException:
+            self.release(credentials, mailbox)
+            raise
+        else:
+            self.release(credentials, mailbox)
+
+    def acquire(self, credentials: "Credentials") -> MailBox:
+        """a healthy logged in mailbox for the account"""
+        key = self._key(credentials)
+        with self._cond:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                if idle:
+                    session = idle.pop()
+                    break
+                if self._in_use.get(key, 0) < self.max_size:
+                    session = None
+                    break
+                self._cond.wait()
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            if session and self._healthy(session):
+                return session.mailbox
+            return self._connect(credentials)
+        except BaseException:
+            with self._cond:
+                self._in_use[key] -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, credentials: "Credentials", mailbox: MailBox, broken: bool = False) -> None:
+        """give a mailbox back, dropping it if the caller saw it fail"""
+        key = self._key(credentials)
+        with self._cond:
+            self._in_use[key] -= 1
+            if broken or self._closed:
+                self._logout(mailbox)
+            else:
+                self._idle.setdefault(key, []).append(Session(mailbox))
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            for sessions in self._idle.values():
+                for session in sessions:
+                    self._logout(session.mailbox)
+            self._idle.clear()
+
+    def _healthy(self, session: Session) -> bool:
+        if time.monotonic() - session.last_used < 1:
+            return True
+        try:
+            with span("imap.noop", api=True):
+                session.mailbox.client.noop()
+            return True
+        except CONNECTION_ERRORS:
+            logger.info("Dropping dead IMAP session")
+            self._logout(session.mailbox)
+            return False
+
+    def _connect(self, credentials: "Credentials") -> MailBox:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span("imap.login", api=True):
+                    mailbox = self.mailbox_factory(credentials.host, int(credentials.port))
+                    return mailbox.login(credentials.username, credentials.password)
+            except CONNECTION_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 60)
+                logger.warning("IMAP login to %s failed (%s), retrying in %ss", credentials.host, e, delay)
+                time.sleep(delay)
+
+    @staticmethod
+    def _logout(mailbox: MailBox) -> None:
+        try:
+            mailbox.logout()
+        except CONNECTION_ERRORS:
+            pass
+
+    def _keep_alive(self) -> None:
+        while not self._closed:
+            time.sleep(min(self.keepalive, self.idle_timeout) / 2)
+            self._sweep()
+
+    def _sweep(self) -> None:
+        """NOOP or expire the idle sessions, one at a time so the rest can be handed out meanwhile"""
+        with self._cond:
+            sessions = [(k, s) for k, idle in self._idle.items() for s in idle]
+        for key, session in sessions:
+            with self._cond:
+                idle = self._idle.get(key, [])
+                if session not in idle:
+                    # handed out since the sweep started
+                    continue
+                idle.remove(session)
+                # counted as in use while it is checked, so the account stays within max_size
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+            alive = time.monotonic() - session.last_used <= self.idle_timeout
+            if alive:
+                try:
+                    session.mailbox.client.noop()
+                except CONNECTION_ERRORS:
+                    alive = False
+            with self._cond:
+                self._in_use[key] -= 1
+                if alive and not self._closed:
+                    # checking it is not a use, the most recently used sessions stay first in line
+                    self._idle.setdefault(key, []).insert(0, session)
+                else:
+                    self._logout(session.mailbox)
+                self._cond.notify()
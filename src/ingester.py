@@ -1,16 +1,31 @@
 import re
 import os
+import json
+import hashlib
+from pathlib import Path
+from logging import getLogger
 from datetime import date, datetime, timedelta
 from abc import ABC
-from typing import Optional, TYPE_CHECKING
-from imap_tools import MailBox, A
+from typing import Iterator, Optional, TYPE_CHECKING
+from threading import local
 from imaplib import IMAP4
+from imap_tools import MailBox, MailMessage, A, U, imap_utf7
 
 from gcsa.google_calendar import GoogleCalendar
 from gcsa.event import Event
+from googleapiclient.errors import HttpError
+
+from .calendar_cache import BusyCache
+from .checkpoints import Checkpoint, CheckpointStore
+from .imap_pool import CONNECTION_ERRORS, ConnectionPool
+from .settings import CalendarSettings, ImapSettings
+from .timing import span, timed
 
 if TYPE_CHECKING:
     from gcsa.free_busy import TimeRange
+    from .models import Block, Day
+
+logger = getLogger(__name__)
 
 
 class Credentials:
@@ -19,42 +34,45 @@ class Credentials:
     username: str
     password: str
 
-    def __init__(self):
+    def __init__(self, **account):
+        """explicit account values win, the rest come from IMAP_* environment variables"""
         for prop in ("host", "port", "username", "password"):
             envar = f"IMAP_{prop.upper()}"
             try:
-                setattr(self, prop, os.environ[envar])
+                setattr(self, prop, account.get(prop) or os.environ[envar])
             except KeyError:
                 raise Exception(f"Missing {envar} environment variable")
 
 class EmailIngester(ABC):
 
     ALL_MAILBOX = "All Mail"
+    FETCH_ITEMS = ""
 
-    def __init__(self):
-        self.conn = self.Conn()
+    def __init__(self,
+                 conn: Optional["EmailIngester.Conn"] = None,
+                 checkpoints: CheckpointStore | None = None):
+        self.conn = conn or self.Conn()
+        self.checkpoints = checkpoints or CheckpointStore(
+            Path(ImapSettings().state_dir) / "imap_checkpoints.json")
 
     class Conn:
-        def __init__(self):
-            self.credentials = Credentials()
-            self._refresh_mailbox()
-
-        def _refresh_mailbox(self):
-            self.mailbox = MailBox(self.credentials.host)
-
-        def _login(self):
-            self.mailbox.login(self.credentials.username, self.credentials.password)
-            return self.mailbox
+        """checks a logged in mailbox out of the connection pool for the length of a `with`"""
+        def __init__(self,
+                     credentials: Credentials | None = None,
+                     pool: ConnectionPool | None = None):
+            self.credentials = credentials or Credentials()
+            self.pool = pool or ConnectionPool.default()
+            self._held = local()
 
         def __enter__(self):
-            try:
-                return self._login()
-            except IMAP4.error:
-                self._refresh_mailbox()
-                return self._login()
+            mailbox = self.pool.acquire(self.credentials)
+            self._held.__dict__.setdefault("stack", []).append(mailbox)
+            return mailbox
 
         def __exit__(self, exc_type, exc_value, traceback):
-            self.mailbox.logout()
+            mailbox = self._held.stack.pop()
+            broken = exc_type is not None and issubclass(exc_type, CONNECTION_ERRORS)
+            self.pool.release(self.credentials, mailbox, broken=broken)
 
 
     def get_mailboxes(self) -> list:
@@ -72,6 +90,73 @@ class EmailIngester(ABC):
                                              bulk=True,
                                              mark_seen=False)]
 
+    def stream_new_emails(self,
+                          folder: str | None = None,
+                          chunk_size: int | None = None,
+                          initial_days: int = 1,
+                          headers_only: bool = True,
+                          headers: list[str] | None = None) -> Iterator[MailMessage]:
+        """yield the messages that arrived in a folder since the last call, without marking them read.
+
+        The folder's UIDVALIDITY and the highest UID handed out are kept in
+        the checkpoint store, so each run only fetches new UIDs, `chunk_size`
+        messages per round trip. The first run (or one after the server
+        renumbered the folder) starts `initial_days` back instead of reading
+        the whole mailbox. The checkpoint advances after each chunk.
+        Passing `headers` fetches just those header fields instead.
+        """
+        folder = folder or self.ALL_MAILBOX
+        chunk_size = chunk_size or ImapSettings().imap_chunk_size
+        key = f"{self.conn.credentials.username}@{self.conn.credentials.host}/{folder}"
+        with self.conn as mailbox:
+            with span("imap.status", api=True):
+                status = mailbox.folder.status(folder, ["UIDVALIDITY", "UIDNEXT"])
+            mailbox.folder.set(folder)
+            checkpoint = self.checkpoints.get(key)
+            if checkpoint is None or checkpoint.uidvalidity != status["UIDVALIDITY"]:
+                uids = mailbox.uids(A(date_gte=date.today() - timedelta(days=initial_days)))
+                checkpoint = Checkpoint(uidvalidity=status["UIDVALIDITY"], uid=0)
+            elif checkpoint.uid + 1 >= status["UIDNEXT"]:
+                return
+            else:
+                uids = mailbox.uids(A(uid=U(checkpoint.uid + 1, "*")))
+            # "n:*" always matches the newest message, even when it is older than n
+            uids = sorted(int(u) for u in uids if int(u) > checkpoint.uid)
+            for n in range(0, len(uids), chunk_size):
+                chunk = uids[n:n + chunk_size]
+                if headers:
+                    yield from self._fetch_headers(mailbox, chunk, headers)
+                else:
+                    with span("imap.fetch", api=True, messages=len(chunk)):
+                        messages = list(mailbox.fetch(A(uid=[str(u) for u in chunk]),
+                                                      headers_only=headers_only,
+                                                      bulk=True,
+                                                      mark_seen=False))
+                    yield from messages
+                checkpoint.uid = chunk[-1]
+                self.checkpoints.store(key, checkpoint)
+            # everything below UIDNEXT has been considered, even outside the initial window
+            if checkpoint.uid < status["UIDNEXT"] - 1:
+                checkpoint.uid = status["UIDNEXT"] - 1
+                self.checkpoints.store(key, checkpoint)
+
+    @classmethod
+    def labels(cls, message: MailMessage) -> set[str]:
+        """server side labels of a message, plain IMAP has none"""
+        return set()
+
+    def _fetch_headers(self, mailbox: MailBox, uids: list[int], headers: list[str]) -> Iterator[MailMessage]:
+        """fetch only the named header fields, plus any server specific FETCH_ITEMS"""
+        parts = f"(UID FLAGS {self.FETCH_ITEMS} BODY.PEEK[HEADER.FIELDS ({' '.join(headers)})])"
+        with span("imap.fetch", api=True, messages=len(uids)):
+            status, data = mailbox.client.uid("fetch", ",".join(str(u) for u in uids), parts)
+        if status != "OK":
+            raise IMAP4.error(f"fetch failed: {data}")
+        # each message comes back as (envelope, literal) followed by the closing bytes
+        items = [item for item in data if item is not None]
+        for n in range(0, len(items), 2):
+            yield MailMessage(items[n:n + 2])
+
 
 class CalendarIngester(ABC):
     """get and set calendar events from a calendar service"""
@@ -84,6 +169,12 @@ class CalendarIngester(ABC):
         """get all busy windows for a given date, optionally in a time window"""
         raise NotImplementedError
 
+    def get_busy_for_range(self,
+                           start: date,
+                           end: date) -> list:
+        """get all busy windows from the start of `start` to the end of `end`"""
+        raise NotImplementedError
+
     def set_event(self,
                   start: datetime,
                   end: datetime,
@@ -93,26 +184,218 @@ class CalendarIngester(ABC):
         """add an event to a calendar"""
         raise NotImplementedError
 
+    def publish_plan(self, day: "Day") -> None:
+        """make the calendar's block events for a day match the day's blocks"""
+        raise NotImplementedError
+
 
 class GmailIngester(EmailIngester):
     ALL_MAILBOX = "[Gmail]/All Mail"
+    FETCH_ITEMS = "X-GM-LABELS"
+
+    LABELS = re.compile(rb'X-GM-LABELS \(((?:"(?:[^"\\]|\\.)*"|[^")])*)\)')
+    LABEL = re.compile(rb'"((?:[^"\\]|\\.)*)"|([^\s"]+)')
+
+    @classmethod
+    def labels(cls, message: MailMessage) -> set[str]:
+        """the gmail labels of a message fetched with X-GM-LABELS"""
+        for raw in message._raw_flag_data:
+            if found := cls.LABELS.search(raw):
+                return {imap_utf7.decode((quoted or atom).replace(b"\\\\", b"\\"))
+                        for quoted, atom in cls.LABEL.findall(found.group(1))}
+        return set()
 
 
 class GoogleCalendarIngester(CalendarIngester):
-    """get and set calendar events from Google Calendar"""
+    """get and set calendar events from Google Calendar
+
+    One `GoogleCalendar` client is shared per process, and busy ranges are
+    served from a `BusyCache` where possible. Anything missing is fetched
+    with a single free/busy call for every calendar and day that needs it,
+    and stale days are checked against every calendar's events sync token
+    in a single batch request.
+    """
+    _shared_client: GoogleCalendar | None = None
+
+    def __init__(self,
+                 client: GoogleCalendar | None = None,
+                 cache: BusyCache | None = None):
+        self._client = client
+        self.settings = CalendarSettings()
+        self.cache = cache or BusyCache(Path(self.settings.state_dir) / "calendar_cache.json",
+                                        ttl=self.settings.calendar_cache_ttl)
+        self.published_path = Path(self.settings.state_dir).expanduser() / "published_events.json"
+
+    @property
+    def client(self) -> GoogleCalendar:
+        if self._client is None:
+            if GoogleCalendarIngester._shared_client is None:
+                GoogleCalendarIngester._shared_client = GoogleCalendar()
+            self._client = GoogleCalendarIngester._shared_client
+        return self._client
 
     def get_busy_for_date(self,
                           date: date,
                           after: datetime | None = None,
                           before: datetime | None = None) -> list["TimeRange"]:
 
-        client = GoogleCalendar()
-        busy_times = client.get_free_busy(
-            [c.id for c in client.get_calendar_list()],
-            time_min=date,
-            time_max=date + timedelta(days=1))
-        busy_ranges = [event for cal in list(busy_times.calendars.values()) for event in cal]
-        return busy_ranges
+        return self.get_busy_for_range(date, date)
+
+    @timed("calendar.busy")
+    def get_busy_for_range(self,
+                           start: date,
+                           end: date) -> list["TimeRange"]:
+
+        busy_ranges = set()
+        for ranges in self.get_busy_by_calendar(start, end).values():
+            busy_ranges.update(ranges)
+        return sorted(busy_ranges)
+
+    def get_busy_by_calendar(self,
+                             start: date,
+                             end: date,
+                             calendar_ids: list[str] | None = None) -> dict[str, list["TimeRange"]]:
+        """busy windows from the start of `start` to the end of `end`, kept apart per calendar.
+
+        Defaults to every calendar in our list; other people's calendars can
+        be given by email as long as they share at least their free/busy.
+        """
+        calendar_ids = calendar_ids or self._calendar_ids()
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        self._revalidate(calendar_ids, days)
+        busy = {calendar_id: set() for calendar_id in calendar_ids}
+        missing = {}
+        for calendar_id in calendar_ids:
+            for day in days:
+                if (cached := self.cache.get(calendar_id, day)) is None:
+                    missing.setdefault(calendar_id, []).append(day)
+                else:
+                    busy[calendar_id].update(cached)
+        if missing:
+            for calendar_id, ranges in self._fetch(missing).items():
+                busy[calendar_id].update(ranges)
+        return {calendar_id: sorted(ranges) for calendar_id, ranges in busy.items()}
+
+    def _calendar_ids(self) -> list[str]:
+        if (ids := self.cache.calendar_ids()) is None:
+            with span("google.calendar_list", api=True):
+                ids = [c.id for c in self.client.get_calendar_list()]
+            self.cache.set_calendar_ids(ids)
+            self.cache.save()
+        return ids
+
+    @staticmethod
+    def _day_bounds(day: date) -> tuple[datetime, datetime]:
+        start = datetime.combine(day, datetime.min.time()).astimezone()
+        return start, start + timedelta(days=1)
+
+    def _fetch(self, missing: dict[str, list[date]]) -> dict[str, list["TimeRange"]]:
+        """one free/busy call covering every calendar and day not in the cache"""
+        first = min(d for days in missing.values() for d in days)
+        last = max(d for days in missing.values() for d in days)
+        with span("google.freebusy", api=True, calendars=len(missing)):
+            busy_times = self.client.get_free_busy(
+                list(missing),
+                time_min=self._day_bounds(first)[0],
+                time_max=self._day_bounds(last)[1])
+        fetched = {}
+        for calendar_id, days in missing.items():
+            ranges = busy_times.calendars.get(calendar_id, [])
+            for day in days:
+                day_start, day_end = self._day_bounds(day)
+                day_ranges = [r for r in ranges if r.start < day_end and r.end > day_start]
+                self.cache.put(calendar_id, day, day_ranges)
+                fetched.setdefault(calendar_id, []).extend(day_ranges)
+        unsynced = {calendar_id: None for calendar_id in missing if self.cache.sync_token(calendar_id) is None}
+        for calendar_id, (_, token) in self._sync(unsynced).items():
+            self.cache.set_sync_token(calendar_id, token)
+        self.cache.save()
+        return fetched
+
+    def _revalidate(self, calendar_ids: list[str], days: list[date]) -> None:
+        """keep stale days whose calendar has not changed since the last sync token"""
+        stale = {calendar_id: self.cache.stale(calendar_id, days) for calendar_id in calendar_ids}
+        tokens = {calendar_id: token for calendar_id in calendar_ids
+                  if stale[calendar_id] and (token := self.cache.sync_token(calendar_id))}
+        if not tokens:
+            return
+        for calendar_id, (changed, token) in self._sync(tokens).items():
+            self.cache.set_sync_token(calendar_id, token)
+            if changed:
+                self.cache.invalidate(calendar_id)
+            else:
+                self.cache.touch(calendar_id, stale[calendar_id])
+        self.cache.save()
+
+    def _sync(self, tokens: dict[str, str | None]) -> dict[str, tuple[bool, str | None]]:
+        """whether each calendar's events changed since its token, and its next token.
+
+        A calendar without a token gets its initial (id only) sync. The first
+        page for every calendar goes out in one batch request, and no calendar
+        is listed past `calendar_sync_pages` pages. A calendar that needs more,
+        or whose events can not be listed (e.g. another person's calendar
+        shared as free/busy only), gets "" as its token and from then on is
+        refetched whenever its days go stale.
+        """
+        results = {}
+        next_pages = {}
+
+        def record(calendar_id: str):
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    results[calendar_id] = self._sync_failed(calendar_id, exception)
+                elif page_token := response.get("nextPageToken"):
+                    next_pages[calendar_id] = (bool(response.get("items")), page_token)
+                else:
+                    results[calendar_id] = (bool(response.get("items")), response.get("nextSyncToken"))
+            return callback
+
+        if not tokens:
+            return results
+        batch = self.client.service.new_batch_http_request()
+        for calendar_id, token in tokens.items():
+            batch.add(self._events_page(calendar_id, token), callback=record(calendar_id))
+        with span("google.events_sync", api=True, calendars=len(tokens)):
+            batch.execute()
+        for calendar_id, (changed, page_token) in next_pages.items():
+            results[calendar_id] = self._sync_rest(calendar_id, tokens[calendar_id], changed, page_token)
+        return results
+
+    def _sync_rest(self,
+                   calendar_id: str,
+                   token: str | None,
+                   changed: bool,
+                   page_token: str) -> tuple[bool, str | None]:
+        """list a calendar's remaining sync pages, up to `calendar_sync_pages` in all"""
+        for _ in range(self.settings.calendar_sync_pages - 1):
+            try:
+                with span("google.events_sync", api=True):
+                    response = self._events_page(calendar_id, token, page_token).execute()
+            except HttpError as e:
+                return self._sync_failed(calendar_id, e)
+            changed = changed or bool(response.get("items"))
+            if not (page_token := response.get("nextPageToken")):
+                return changed, response.get("nextSyncToken")
+        logger.info("Not syncing %s, its events take more than %s pages",
+                    calendar_id, self.settings.calendar_sync_pages)
+        return True, ""
+
+    def _events_page(self, calendar_id: str, token: str | None, page_token: str | None = None):
+        return self.client.service.events().list(
+            calendarId=calendar_id,
+            syncToken=token,
+            pageToken=page_token,
+            showDeleted=True,
+            maxResults=2500,
+            fields="items(id),nextPageToken,nextSyncToken")
+
+    @staticmethod
+    def _sync_failed(calendar_id: str, exception: Exception) -> tuple[bool, str | None]:
+        if isinstance(exception, HttpError) and exception.resp.status == 410:
+            logger.info("Sync token for %s expired, refetching", calendar_id)
+            return True, None
+        logger.info("Can not sync events for %s: %s", calendar_id, exception)
+        return True, ""
 
     def set_event(self,
                   start: datetime,
@@ -121,12 +404,131 @@ class GoogleCalendarIngester(CalendarIngester):
                   body: Optional[str] = None,
                   location: Optional[str] = None) -> None:
 
-        client = GoogleCalendar()
         event = Event(
             title,
             start=start,
             end=end,
             description=body,
             location=location)
-        client.add_event(event)
+        with span("google.add_event", api=True):
+            self.client.add_event(event)
+
+    @timed("calendar.publish")
+    def publish_plan(self, day: "Day") -> None:
+        """make the calendar's block events for a day match the day's blocks.
+
+        Events we created carry the block id in their private extended
+        properties, and the event id and a content hash of what we last sent
+        are remembered locally, so only creates, updates and deletes go out,
+        together in one batch request. Without a local record the day's
+        block events are listed first. Block events are transparent so they
+        never show up as busy time when planning.
+        """
+        calendar_id = self.settings.calendar_email
+        published = self._load_published()
+        key = day.date.isoformat()
+        if key not in published:
+            published[key] = self._list_block_events(calendar_id, day)
+        existing: dict[str, dict] = published[key]
+        desired = {str(b.id): self._block_event(b) for b in day.blocks}
+
+        service = self.client.service
+        batch = service.new_batch_http_request()
+        changes = 0
+        for block_id, body in desired.items():
+            digest = hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+            body["extendedProperties"]["private"]["singularityHash"] = digest
+            if block_id not in existing:
+                batch.add(service.events().insert(calendarId=calendar_id, body=body),
+                          callback=self._record_insert(existing, block_id, digest))
+            elif existing[block_id]["hash"] != digest:
+                batch.add(service.events().patch(calendarId=calendar_id,
+                                                 eventId=existing[block_id]["event_id"],
+                                                 body=body),
+                          callback=self._record_patch(existing, block_id, digest))
+            else:
+                continue
+            changes += 1
+        for block_id in set(existing) - set(desired):
+            batch.add(service.events().delete(calendarId=calendar_id,
+                                              eventId=existing[block_id]["event_id"]),
+                      callback=self._record_delete(existing, block_id))
+            changes += 1
+        if changes:
+            with span("google.publish_batch", api=True):
+                batch.execute()
+        logger.info("Published %s block changes for %s", changes, key)
+        self._save_published(published)
+
+    @staticmethod
+    def _block_event(block: "Block") -> dict:
+        tasks = [t.description for t in block.tasks]
+        return {
+            "summary": f"{block.name}: {', '.join(tasks)}" if tasks else block.name,
+            "description": "\n".join(f"- {t}" for t in tasks),
+            "start": {"dateTime": block.start.astimezone().isoformat()},
+            "end": {"dateTime": block.end.astimezone().isoformat()},
+            "transparency": "transparent",
+            "extendedProperties": {"private": {"singularity": "block",
+                                               "singularityBlockId": str(block.id)}},
+        }
+
+    @staticmethod
+    def _record_insert(existing: dict, block_id: str, digest: str):
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logger.error("Failed to publish block %s: %s", block_id, exception)
+                return
+            existing[block_id] = {"event_id": response["id"], "hash": digest}
+        return callback
+
+    @staticmethod
+    def _record_patch(existing: dict, block_id: str, digest: str):
+        def callback(request_id, response, exception):
+            if exception is None:
+                existing[block_id]["hash"] = digest
+            elif isinstance(exception, HttpError) and exception.resp.status in (404, 410):
+                # the event was deleted from the calendar, forget it so the next publish recreates it
+                logger.warning("Block %s's event is gone, it will be recreated", block_id)
+                existing.pop(block_id, None)
+            else:
+                logger.error("Failed to update block %s: %s", block_id, exception)
+        return callback
+
+    @staticmethod
+    def _record_delete(existing: dict, block_id: str):
+        def callback(request_id, response, exception):
+            if exception is None or (isinstance(exception, HttpError) and exception.resp.status in (404, 410)):
+                existing.pop(block_id, None)
+            else:
+                logger.error("Failed to remove block %s: %s", block_id, exception)
+        return callback
+
+    @timed("google.events_list", api=True)
+    def _list_block_events(self, calendar_id: str, day: "Day") -> dict[str, dict]:
+        """the block events we already created on a day, by block id"""
+        day_start, day_end = self._day_bounds(day.date)
+        response = self.client.service.events().list(
+            calendarId=calendar_id,
+            timeMin=day_start.isoformat(),
+            timeMax=day_end.isoformat(),
+            privateExtendedProperty="singularity=block",
+            singleEvents=True,
+            maxResults=250,
+            fields="items(id,extendedProperties)").execute()
+        events = {}
+        for item in response.get("items", []):
+            private = item.get("extendedProperties", {}).get("private", {})
+            events[private["singularityBlockId"]] = {"event_id": item["id"],
+                                                     "hash": private.get("singularityHash")}
+        return events
+
+    def _load_published(self) -> dict:
+        try:
+            return json.loads(self.published_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
 
+    def _save_published(self, published: dict) -> None:
+        self.published_path.parent.mkdir(parents=True, exist_ok=True)
+        self.published_path.write_text(json.dumps(published))
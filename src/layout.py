@@ -0,0 +1,45 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+
+class BlockSpec(NamedTuple):
+    """the shape of a block type as far as layout is concerned"""
+    duration: int
+    break_size: int
+    points: int
+
+
+@lru_cache(maxsize=None)
+def solve(gap: int, specs: tuple[BlockSpec, ...]) -> tuple[int, ...]:
+    """the sequence of block types (indexes into specs) that fits the most points into a gap.
+
+    Every block but the last is followed by its break, the last one may run
+    up to the end of the gap. Solved bottom up over every minute of the gap;
+    ties go to fewer (so bigger) blocks. Memoized on the gap length, so
+    repeated gap sizes across a week are only solved once.
+    """
+    # best[t] = (points, -blocks) achievable in t minutes, choice[t] = first block type
+    best = [(0, 0)] * (gap + 1)
+    choice: list[int | None] = [None] * (gap + 1)
+    for t in range(1, gap + 1):
+        for i, spec in enumerate(specs):
+            if spec.duration > t:
+                continue
+            rest = max(t - spec.duration - spec.break_size, 0)
+            points, blocks = best[rest]
+            candidate = (points + spec.points, blocks - 1)
+            if candidate > best[t]:
+                best[t] = candidate
+                choice[t] = i
+    sequence = []
+    t = gap
+    while t > 0 and choice[t] is not None:
+        spec = specs[choice[t]]
+        sequence.append(choice[t])
+        t = max(t - spec.duration - spec.break_size, 0)
+    return tuple(sequence)
+
+
+def points(gap: int, specs: tuple[BlockSpec, ...]) -> int:
+    """the most points a gap can hold"""
+    return sum(specs[i].points for i in solve(gap, specs))
@@ -1,13 +1,17 @@
-from datetime import datetime, date
-from typing import Optional
-from pydantic import BaseModel, Field
+from datetime import datetime, date, time
+from typing import Optional, TYPE_CHECKING
+from array import array
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from enum import Enum
 import uuid
-from taskw import TaskWarrior
 
 from .docker_names import get_random_name
-from .settings import Settings
-settings = Settings()
+from .settings import PlannerSettings
+from .timing import timed
+settings = PlannerSettings()
+
+if TYPE_CHECKING:
+    from .repository import TaskRepository
 
 class BlockSize(str, Enum):
     """The size of a block"""
@@ -28,10 +32,12 @@ class Task(BaseModel):
     description: str
     entry: datetime
     modified: datetime | None = None
+    start: datetime | None = None
     status: Status
     tags: list[str] = []
     uuid: str
     points: int
+    urgency: float = 0.0
     partial_group: Optional["uuid.UUID"] = None
     public_status: Optional[str] = Field(None, alias="publictext")
     block_id: Optional["uuid.UUID"] = None
@@ -42,46 +48,85 @@ class Task(BaseModel):
         break_up = "break_up"
         ignore = "ignore"
 
+    @field_validator("entry", "modified", "start", mode="before")
+    @classmethod
+    def parse_taskwarrior_date(cls, value):
+        """accept taskwarrior's compact export format, e.g. 20231001T233615Z"""
+        if isinstance(value, str) and len(value) == 16 and value.endswith("Z"):
+            return datetime.strptime(value, "%Y%m%dT%H%M%S%z")
+        return value
+
     @classmethod
-    def get_active_tasks(cls) -> list["Task"]:
+    @timed("tasks.active")
+    def get_active_tasks(cls, repository: Optional["TaskRepository"] = None) -> list["Task"]:
         """find the task(s) that are currently being worked on"""
-        tw = TaskWarrior()
-        tasks = list(filter(lambda x: x.get('start'),tw.load_tasks(command="pending")['pending']))
-        return [cls(**t) for t in tasks]
+        from .repository import TaskRepository
+        repository = repository or TaskRepository.default()
+        return repository.active()
 
     @classmethod
-    def get_tasks(cls, oversize_strategy:OversizeStrategy=OversizeStrategy.break_up) -> list["Task"]:
+    @timed("tasks.load")
+    def get_tasks(cls,
+                  oversize_strategy:OversizeStrategy=OversizeStrategy.break_up,
+                  repository: Optional["TaskRepository"] = None) -> list["Task"]:
         """get all the tasks from taskwarrior"""
-        tw = TaskWarrior()
-        tasks = tw.load_tasks(command="pending")
+        from .repository import TaskRepository
+        repository = repository or TaskRepository.default()
         if oversize_strategy == cls.OversizeStrategy.break_up:
-            cls.break_up_oversized_tasks()
-        ordered = sorted(tasks, key=lambda x: (x["partial_group"], x["urgency"], x["points"],), reverse=True)
-        return [cls(**t) for t in ordered if t["points"] <= settings.big_max_points]
+            cls.break_up_oversized_tasks(repository)
+        ordered = sorted(repository.all(),
+                         key=lambda x: (str(x.partial_group or ""), x.urgency, x.points,),
+                         reverse=True)
+        return [t for t in ordered if t.points <= settings.big_max_points]
 
     @classmethod
-    def break_up_oversized_tasks(cls) -> None:
-        tw = TaskWarrior()
-        tasks = tw.load_tasks(command="pending")
-        oversized = [t for t in tasks if t["points"] > settings.big_max_points]
+    def break_up_oversized_tasks(cls, repository: Optional["TaskRepository"] = None) -> None:
+        """split tasks bigger than a big block into a partial group, in one batch write.
+
+        The original task keeps the first big block worth of points and the
+        rest go to new partials. Partial ids are derived from the original
+        uuid and split tasks are skipped, so re-running this is a no-op.
+        """
+        from .repository import TaskRepository
+        repository = repository or TaskRepository.default()
+        oversized = [t for t in repository.records()
+                     if int(t.get("points", 0)) > settings.big_max_points
+                     and not t.get("partial_group")]
+        batch = []
         for task in oversized:
-            count = task["points"] // settings.big_max_points
-            partial_group = str(uuid.uuid4())
-            tw = TaskWarrior()
-            for _ in range(count):
-                tw.add_task(description=task["description"],
-                            entry=task["entry"],
-                            status="pending",
-                            tags=task["tags"],
-                            partial_group=partial_group,
-                            points=settings.big_max_points)
-            tw.execute_command(f"task {task['uuid']} modify points:{settings.big_max_points} partial_group:{partial_group}")
+            batch.extend(cls._split_record(task))
+        if batch:
+            repository.import_tasks(batch)
+
+    @classmethod
+    def _split_record(cls, task: dict) -> list[dict]:
+        """the modified original plus its partials, as pending.data records"""
+        partial_group = str(uuid.uuid5(uuid.NAMESPACE_URL, f"singularity:{task['uuid']}"))
+        remaining = int(task["points"]) - settings.big_max_points
+        split = [{**task,
+                  "points": str(settings.big_max_points),
+                  "partial_group": partial_group}]
+        index = 0
+        while remaining > 0:
+            index += 1
+            points = min(remaining, settings.big_max_points)
+            partial = {"description": task["description"],
+                       "entry": task["entry"],
+                       "status": "pending",
+                       "uuid": str(uuid.uuid5(uuid.UUID(partial_group), str(index))),
+                       "partial_group": partial_group,
+                       "points": str(points)}
+            if task.get("tags"):
+                partial["tags"] = task["tags"]
+            split.append(partial)
+            remaining -= points
+        return split
 
 
 class Block(BaseModel):
     """Represents a Work Block, or solid set of time to work one or more tasks.
     """
-    id: uuid.UUID = uuid.uuid4()
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     index: int
     name: str | None = None
     start: datetime
@@ -90,22 +135,96 @@ class Block(BaseModel):
     size: BlockSize
     max_points: int
     break_size: int
-    tasks: list[Task]
+    tasks: list[Task] = []
+    _used_points: int = PrivateAttr(0)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.name = f"{self.index}-{get_random_name()}"
+        if self.name is None:
+            self.name = f"{self.index}-{get_random_name()}"
+
+    def model_post_init(self, __context) -> None:
+        self._used_points = sum(t.points for t in self.tasks)
+
+    @property
+    def used_points(self) -> int:
+        """the number of points already assigned to this block"""
+        return self._used_points
 
     @property
     def available_points(self) -> int:
         """the number of points available in this block"""
-        return self.max_points - sum([t.points for t in self.tasks])
+        return self.max_points - self._used_points
+
+    def can_fit(self, task:Task)-> bool:
+        """True if the task fits in the points left in this block"""
+        return task.points <= self.available_points
 
     def add_task(self, task:Task)-> None:
         """add a task to this block"""
         task.block = self.name
         task.block_id = self.id
         self.tasks.append(task)
+        self._used_points += task.points
+
+    def remove_task(self, task:Task)-> None:
+        """take a task back out of this block"""
+        for i, assigned in enumerate(self.tasks):
+            if assigned is task:
+                del self.tasks[i]
+                break
+        else:
+            raise ValueError(f"{task.description} is not in block {self.name}")
+        task.block = None
+        task.block_id = None
+        self._used_points -= task.points
+
+
+class PlanState:
+    """A compact task -> block assignment that solvers can mutate and roll back.
+
+    Remaining capacity and the assignment live in flat int arrays indexed by
+    block and task position, and every assignment is pushed on a trail, so
+    trying a move and undoing it are both O(1).
+    """
+    __slots__ = ("remaining", "points", "assignment", "_trail")
+
+    def __init__(self, remaining: list[int], points: list[int]):
+        self.remaining = array("i", remaining)
+        self.points = array("i", points)
+        self.assignment = array("i", [-1] * len(points))
+        self._trail: list[int] = []
+
+    @classmethod
+    def from_blocks(cls, blocks: list[Block], tasks: list[Task]) -> "PlanState":
+        return cls([b.available_points for b in blocks], [t.points for t in tasks])
+
+    def fits(self, task: int, block: int) -> bool:
+        return self.points[task] <= self.remaining[block]
+
+    def assign(self, task: int, block: int) -> None:
+        self.remaining[block] -= self.points[task]
+        self.assignment[task] = block
+        self._trail.append(task)
+
+    def checkpoint(self) -> int:
+        """a marker to roll back to"""
+        return len(self._trail)
+
+    def rollback(self, checkpoint: int = 0) -> None:
+        """undo every assignment made since the checkpoint"""
+        while len(self._trail) > checkpoint:
+            task = self._trail.pop()
+            self.remaining[self.assignment[task]] += self.points[task]
+            self.assignment[task] = -1
+
+    def packed_points(self) -> int:
+        return sum(self.points[t] for t in self._trail)
+
+    def apply(self, blocks: list[Block], tasks: list[Task]) -> None:
+        """write the assignment back onto the Block models"""
+        for task in sorted(self._trail):
+            blocks[self.assignment[task]].add_task(tasks[task])
 
 class BigBlock(Block):
     """A Big Block is a Work Block that is 80 minutes long with a 17 minute break"""
@@ -135,30 +254,34 @@ class Day(BaseModel):
     start_time: datetime
     end_time: datetime
 
-    def __init__(self, day: date|str = date.today()):
-        super().__init__()
+    def __init__(self, day: date|str = date.today(), blocks: list[Block] | None = None, **data):
+        if "date" in data:
+            # loading a saved Day
+            super().__init__(blocks=blocks, **data)
+            return
         try:
-            self.date = date.fromisoformat(day)
-        except ValueError:
-            self.date = day
-        settings = Settings()
-        self.start_time = datetime.combine(self.date, settings.start_time)
-        self.end_time = datetime.combine(self.date, settings.end_time)
-        self.blocks = sorted(self.blocks, key=lambda x: x.start)
-
-        def next_block(self, block: Block) -> Block | None:
-            """get the next block or none if it is the last block"""
-            try:
-                return self.blocks[block.index+1]
-            except IndexError:
-                return None
-
-        def most_space_available_block(self)-> Block | None:
-            """Returns the block with the most space that is not full or None if all are full"""
-            most_space = self.blocks[0]
-            for block in self.blocks:
-                if block.available_points > most_space.available_points:
-                    most_space = block
-            if most_space.available_points:
-                return most_space
+            day = date.fromisoformat(day)
+        except (TypeError, ValueError):
+            pass
+        settings = PlannerSettings()
+        super().__init__(date=day,
+                         blocks=sorted(blocks or [], key=lambda x: x.start),
+                         start_time=datetime.combine(day, time.fromisoformat(settings.start_time)),
+                         end_time=datetime.combine(day, time.fromisoformat(settings.end_time)))
+
+    def next_block(self, block: Block) -> Block | None:
+        """get the next block or none if it is the last block"""
+        try:
+            return self.blocks[block.index+1]
+        except IndexError:
             return None
+
+    def most_space_available_block(self)-> Block | None:
+        """Returns the block with the most space that is not full or None if all are full"""
+        most_space = self.blocks[0]
+        for block in self.blocks:
+            if block.available_points > most_space.available_points:
+                most_space = block
+        if most_space.available_points:
+            return most_space
+        return None
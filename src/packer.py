@@ -0,0 +1,218 @@
+import heapq
+import sys
+import time
+from enum import Enum
+from logging import getLogger
+from itertools import groupby
+
+from .models import Block, PlanState, Task
+
+logger = getLogger(__name__)
+
+
+class Strategy(str, Enum):
+    """How tasks are packed into blocks"""
+    first_fit_decreasing = "first_fit_decreasing"
+    best_fit = "best_fit"
+    branch_and_bound = "branch_and_bound"
+
+
+class CapacityTree:
+    """A tournament tree (max-heap laid over block order) of remaining capacity.
+
+    Finds the earliest block with room for n points in O(log blocks) and
+    updates in O(log blocks).
+    """
+
+    def __init__(self, capacities: list[int]):
+        self.size = 1
+        while self.size < max(len(capacities), 1):
+            self.size *= 2
+        self.tree = [-1] * (2 * self.size)
+        self.tree[self.size:self.size + len(capacities)] = capacities
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def update(self, index: int, capacity: int) -> None:
+        i = self.size + index
+        self.tree[i] = capacity
+        i //= 2
+        while i:
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+            i //= 2
+
+    def first_fit(self, points: int) -> int | None:
+        """the earliest block with at least `points` remaining"""
+        if self.tree[1] < points:
+            return None
+        i = 1
+        while i < self.size:
+            i = 2 * i if self.tree[2 * i] >= points else 2 * i + 1
+        return i - self.size
+
+
+class CapacityBuckets:
+    """A min-heap of block indexes per remaining capacity.
+
+    Capacities are small integers (a block holds at most a few dozen
+    points), so the tightest block for n points is found by walking the
+    buckets from n up, and a changed block is pushed into its new bucket in
+    O(log blocks). Entries whose block has since changed capacity are
+    dropped as they reach the top of their bucket.
+    """
+
+    def __init__(self, capacities: list[int]):
+        self.capacities = capacities
+        self.buckets: list[list[int]] = [[] for _ in range(max(capacities, default=0) + 1)]
+        for block, capacity in enumerate(capacities):
+            if capacity >= 0:
+                self.buckets[capacity].append(block)
+
+    def update(self, block: int) -> None:
+        if self.capacities[block] >= 0:
+            heapq.heappush(self.buckets[self.capacities[block]], block)
+
+    def best_fit(self, points: int) -> int | None:
+        """the earliest of the blocks with the least room left over for `points`"""
+        for capacity in range(max(points, 0), len(self.buckets)):
+            bucket = self.buckets[capacity]
+            while bucket and self.capacities[bucket[0]] != capacity:
+                heapq.heappop(bucket)
+            if bucket:
+                return bucket[0]
+        return None
+
+
+class Packer:
+    """Assigns tasks to blocks.
+
+    Partial groups always go first and take a run of consecutive blocks, one
+    partial per block, like `Builder._assign_partials` did. The rest are
+    packed by the chosen strategy:
+
+        - first_fit_decreasing: biggest first into the earliest block with room
+        - best_fit: biggest first into the block it leaves least room in
+        - branch_and_bound: exact max-points search, cut off at `time_budget`
+          seconds with the best packing found so far
+
+    The greedy strategies keep urgency order by packing `group_size` tasks
+    at a time, largest first within each group.
+    """
+
+    def __init__(self,
+                 strategy: Strategy = Strategy.best_fit,
+                 time_budget: float = 0.5,
+                 group_size: int = 10):
+        self.strategy = Strategy(strategy)
+        self.time_budget = time_budget
+        self.group_size = group_size
+
+    def pack(self, tasks: list[Task], blocks: list[Block]) -> list[Task]:
+        """add tasks to blocks, returning the ones that did not fit"""
+        blocks = sorted(blocks, key=lambda b: b.start)
+        state = PlanState.from_blocks(blocks, tasks)
+        unplaced: list[Task] = []
+
+        partials = sorted((i for i, t in enumerate(tasks) if t.partial_group),
+                          key=lambda i: (str(tasks[i].partial_group), i))
+        for _, group in groupby(partials, key=lambda i: tasks[i].partial_group):
+            group = list(group)
+            if not self._place_partials(group, state):
+                logger.error(f"Not enough room for partials tasks {tasks[group[0]].description}")
+                unplaced.extend(tasks[i] for i in group)
+
+        indexes = [i for i, t in enumerate(tasks) if not t.partial_group]
+        if self.strategy == Strategy.branch_and_bound:
+            unplaced_indexes = self._branch_and_bound(indexes, state)
+        else:
+            unplaced_indexes = self._greedy(indexes, state)
+        unplaced.extend(tasks[i] for i in unplaced_indexes)
+
+        state.apply(blocks, tasks)
+        for task in unplaced:
+            logger.error(f"Could not fit {task.description} into any block")
+        logger.info(f"packed {len(tasks) - len(unplaced)} of {len(tasks)} tasks into {len(blocks)} blocks")
+        return unplaced
+
+    @staticmethod
+    def _place_partials(group: list[int], state: PlanState) -> bool:
+        """put a partial group into the earliest run of consecutive blocks with room"""
+        for first in range(len(state.remaining) - len(group) + 1):
+            if all(state.fits(i, first + n) for n, i in enumerate(group)):
+                for n, i in enumerate(group):
+                    state.assign(i, first + n)
+                return True
+        return False
+
+    def _greedy(self, indexes: list[int], state: PlanState) -> list[int]:
+        unplaced = []
+        remaining = state.remaining
+        tree = CapacityTree(list(remaining))
+        buckets = CapacityBuckets(remaining)
+        for n in range(0, len(indexes), self.group_size):
+            group = sorted(indexes[n:n + self.group_size], key=lambda i: state.points[i], reverse=True)
+            for i in group:
+                points = state.points[i]
+                if self.strategy == Strategy.best_fit:
+                    block = buckets.best_fit(points)
+                else:
+                    block = tree.first_fit(points)
+                if block is None:
+                    unplaced.append(i)
+                    continue
+                state.assign(i, block)
+                buckets.update(block)
+                tree.update(block, remaining[block])
+        return unplaced
+
+    def _branch_and_bound(self, indexes: list[int], state: PlanState) -> list[int]:
+        """depth first search over task -> block choices for the most packed points"""
+        order = sorted(indexes, key=lambda i: state.points[i], reverse=True)
+        points = [state.points[i] for i in order]
+        # points still to decide from position k onwards, for the upper bound
+        suffix = [0] * (len(order) + 1)
+        for k in range(len(order) - 1, -1, -1):
+            suffix[k] = suffix[k + 1] + points[k]
+
+        start = state.checkpoint()
+        base = state.packed_points()
+        total_free = sum(state.remaining)
+        # seed with first fit decreasing so a timeout still returns a good packing
+        Packer(Strategy.first_fit_decreasing, group_size=len(order) or 1)._greedy(order, state)
+        best = {"points": state.packed_points() - base, "assignment": state.assignment[:]}
+        state.rollback(start)
+
+        deadline = time.monotonic() + self.time_budget
+        nodes = 0
+
+        def search(k: int, packed: int) -> bool:
+            nonlocal nodes
+            nodes += 1
+            if nodes % 1024 == 0 and time.monotonic() > deadline:
+                return False
+            if packed > best["points"]:
+                best["points"], best["assignment"] = packed, state.assignment[:]
+            if k == len(order) or packed + min(suffix[k], total_free - packed) <= best["points"]:
+                return True
+            tried = set()
+            for b, room in enumerate(state.remaining):
+                # blocks with the same room left are interchangeable
+                if room < points[k] or room in tried:
+                    continue
+                tried.add(room)
+                mark = state.checkpoint()
+                state.assign(order[k], b)
+                finished = search(k + 1, packed + points[k])
+                state.rollback(mark)
+                if not finished:
+                    return False
+            return search(k + 1, packed)
+
+        if len(order) > sys.getrecursionlimit() - 100:
+            logger.info("too many tasks for an exact search, keeping first fit decreasing")
+        elif not search(0, 0):
+            logger.info(f"branch and bound hit its {self.time_budget}s budget after {nodes} nodes")
+        for i in order:
+            if best["assignment"][i] >= 0:
+                state.assign(i, best["assignment"][i])
+        return [i for i in order if best["assignment"][i] < 0]
@@ -0,0 +1,181 @@
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from logging import getLogger
+from typing import AsyncIterator, Callable, Hashable, Iterable
+
+from pydantic import BaseModel
+
+from .dedupe import DedupeIndex
+from .repository import TaskRepository
+
+logger = getLogger(__name__)
+
+
+class IngestItem(BaseModel):
+    """one normalized thing from a source that may become a task"""
+    source: str
+    source_id: str
+    title: str
+    body: str = ""
+    tags: list[str] = []
+    points: int = 1
+    project: str | None = None
+
+    @property
+    def uuid(self) -> str:
+        """stable task uuid, so the same item always maps to the same task"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"singularity:{self.source}:{self.source_id.strip()}"))
+
+    def record(self) -> dict:
+        """the item as a pending.data record"""
+        record = {"description": self.title,
+                  "entry": str(int(datetime.now().timestamp())),
+                  "status": "pending",
+                  "uuid": self.uuid,
+                  "points": str(self.points)}
+        if self.tags:
+            record["tags"] = self.tags
+        if self.project:
+            record["project"] = self.project
+        return record
+
+
+class AsyncIngester(ABC):
+    """A source of items that can be fetched concurrently with other sources.
+
+    A source splits its work into partitions (folders, projects, channels...).
+    The pipeline fetches at most `concurrency` partitions of a source at once
+    and gives the source as a whole `timeout` seconds.
+    """
+    name: str = "source"
+    concurrency: int = 1
+    timeout: float = 60
+
+    def partitions(self) -> Iterable[Hashable]:
+        return [None]
+
+    @abstractmethod
+    def fetch(self, partition: Hashable) -> AsyncIterator[IngestItem]:
+        """stream the items of one partition"""
+
+
+class ThreadedIngester(AsyncIngester):
+    """runs a blocking fetch function in a worker thread, for the sync ingesters"""
+
+    def __init__(self,
+                 name: str,
+                 fetch: Callable[[Hashable], Iterable[IngestItem]],
+                 partitions: Iterable[Hashable] = (None,),
+                 concurrency: int = 1,
+                 timeout: float = 60):
+        self.name = name
+        self._fetch = fetch
+        self._partitions = list(partitions)
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def partitions(self) -> Iterable[Hashable]:
+        return self._partitions
+
+    async def fetch(self, partition: Hashable) -> AsyncIterator[IngestItem]:
+        for item in await asyncio.to_thread(lambda: list(self._fetch(partition))):
+            yield item
+
+
+class SourceResult(BaseModel):
+    name: str
+    fetched: int = 0
+    created: int = 0
+    errors: list[str] = []
+    seconds: float = 0.0
+
+
+class Pipeline:
+    """Fetches every source concurrently and files new items as tasks.
+
+    Sources stream into one queue. A single sink drops items already seen in
+    this run or already in the dedupe index (their task may since have been
+    completed, so it is not filed again), and items whose task is pending,
+    then imports the rest into taskwarrior in batches of `batch_size` and
+    records the batch in the index. A source that fails or times out
+    is reported and does not stop the others, so a run takes as long as the
+    slowest source.
+    """
+
+    def __init__(self,
+                 sources: list[AsyncIngester],
+                 repository: TaskRepository | None = None,
+                 index: DedupeIndex | None = None,
+                 batch_size: int = 100,
+                 queue_size: int = 1000):
+        self.sources = sources
+        self.repository = repository or TaskRepository.default()
+        self.index = index or DedupeIndex()
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run_sync(self) -> dict[str, SourceResult]:
+        return asyncio.run(self.run())
+
+    async def run(self) -> dict[str, SourceResult]:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        results = {s.name: SourceResult(name=s.name) for s in self.sources}
+        sink = asyncio.create_task(self._sink(queue))
+        await asyncio.gather(*(self._run_source(s, queue, results[s.name]) for s in self.sources))
+        await queue.put(None)
+        await sink
+        for result in results.values():
+            logger.info("%s: fetched %s, created %s in %.2fs%s", result.name, result.fetched,
+                        result.created, result.seconds, f", errors: {result.errors}" if result.errors else "")
+        return results
+
+    async def _run_source(self, source: AsyncIngester, queue: asyncio.Queue, result: SourceResult) -> None:
+        started = time.perf_counter()
+        limit = asyncio.Semaphore(source.concurrency)
+
+        async def partition(key: Hashable) -> None:
+            async with limit:
+                try:
+                    async for item in source.fetch(key):
+                        result.fetched += 1
+                        await queue.put((result, item))
+                except Exception as e:
+                    logger.exception("Source %s failed on %s", source.name, key)
+                    result.errors.append(f"{key}: {e}")
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(partition(k) for k in source.partitions())),
+                                   source.timeout)
+        except TimeoutError:
+            result.errors.append(f"timed out after {source.timeout}s")
+        result.seconds = time.perf_counter() - started
+
+    async def _sink(self, queue: asyncio.Queue) -> None:
+        uuids: set[str] = set()
+        batch: dict[str, tuple[SourceResult, IngestItem]] = {}
+        while (entry := await queue.get()) is not None:
+            key = entry[1].uuid
+            if key in uuids:
+                continue
+            uuids.add(key)
+            batch[key] = entry
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch = {}
+        if batch:
+            await self._flush(batch)
+
+    async def _flush(self, batch: dict[str, tuple[SourceResult, IngestItem]]) -> None:
+        # an item in the index already has a task, pending or not, so only its new hash is recorded
+        unfiled, changed = self.index.changes([item for _, item in batch.values()])
+        # the lookup may re-read pending.data, which must not hold up the sources
+        new = await asyncio.to_thread(lambda: [i for i in unfiled if self.repository.get(i.uuid) is None])
+        if new:
+            await asyncio.to_thread(self.repository.import_tasks, [i.record() for i in new])
+            for item in new:
+                batch[item.uuid][0].created += 1
+        if unfiled or changed:
+            self.index.upsert(unfiled + changed)
@@ -0,0 +1,118 @@
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from logging import getLogger
+from typing import NamedTuple
+
+from .models import BlockSize, Day
+from .settings import CommonSettings
+
+logger = getLogger(__name__)
+
+SLOT_COLUMNS = "id, name, size, start, end, break_end, lunch"
+
+
+class Slot(NamedTuple):
+    """where a block sits in time, as indexed by the plan store"""
+    block_id: str
+    name: str
+    size: str
+    start: datetime
+    end: datetime
+    break_end: datetime
+    lunch: bool
+
+
+class PlanStore:
+    """Keeps the last plan for each day in SQLite under state_dir.
+
+    Each day is stored whole as JSON, and its blocks also go into a table
+    indexed by start time. Blocks in a plan never overlap, so the block
+    running at a moment is the last one starting at or before it, which is a
+    single index seek.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or Path(CommonSettings().state_dir) / "plans.sqlite3").expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as db, db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS days (date TEXT PRIMARY KEY, plan TEXT NOT NULL)")
+            db.execute("""CREATE TABLE IF NOT EXISTS blocks (
+                              id TEXT PRIMARY KEY,
+                              date TEXT NOT NULL,
+                              name TEXT NOT NULL,
+                              size TEXT NOT NULL,
+                              start REAL NOT NULL,
+                              end REAL NOT NULL,
+                              break_end REAL NOT NULL,
+                              lunch INTEGER NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS blocks_start ON blocks (start)")
+            db.execute("CREATE INDEX IF NOT EXISTS blocks_date ON blocks (date)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per call keeps the store safe to share between the daemon's threads
+        return sqlite3.connect(self.path, timeout=5)
+
+    def load(self, day: date) -> Day | None:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT plan FROM days WHERE date = ?", (day.isoformat(),)).fetchone()
+        if row is None:
+            return None
+        try:
+            return Day.model_validate_json(row[0])
+        except ValueError:
+            logger.warning("Ignoring unreadable plan for %s", day)
+            return None
+
+    def save(self, day: Day) -> None:
+        key = day.date.isoformat()
+        with closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO days (date, plan) VALUES (?, ?)",
+                       (key, day.model_dump_json(by_alias=True)))
+            db.execute("DELETE FROM blocks WHERE date = ?", (key,))
+            db.executemany(
+                f"INSERT OR REPLACE INTO blocks (date, {SLOT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(key, str(b.id), b.name, BlockSize(b.size).value,
+                  b.start.timestamp(),
+                  b.end.timestamp(),
+                  (b.end + timedelta(minutes=b.break_size)).timestamp(),
+                  any("lunch" in t.tags for t in b.tasks))
+                 for b in day.blocks])
+
+    def block_at(self, moment: datetime | None = None) -> Slot | None:
+        """the block running at `moment` (default now), if any"""
+        moment = moment or datetime.now()
+        with closing(self._connect()) as db:
+            row = db.execute(f"SELECT {SLOT_COLUMNS} FROM blocks WHERE start <= ? ORDER BY start DESC LIMIT 1",
+                             (moment.timestamp(),)).fetchone()
+        slot = self._slot(row)
+        return slot if slot and slot.end > moment else None
+
+    def next_block(self, moment: datetime | None = None) -> Slot | None:
+        """the first block starting after `moment` (default now)"""
+        moment = moment or datetime.now()
+        with closing(self._connect()) as db:
+            row = db.execute(f"SELECT {SLOT_COLUMNS} FROM blocks WHERE start > ? ORDER BY start LIMIT 1",
+                             (moment.timestamp(),)).fetchone()
+        return self._slot(row)
+
+    def slots(self, day: date) -> list[Slot]:
+        """a day's blocks in order"""
+        with closing(self._connect()) as db:
+            rows = db.execute(f"SELECT {SLOT_COLUMNS} FROM blocks WHERE date = ? ORDER BY start",
+                              (day.isoformat(),)).fetchall()
+        return [self._slot(row) for row in rows]
+
+    @staticmethod
+    def _slot(row: tuple | None) -> Slot | None:
+        if row is None:
+            return None
+        block_id, name, size, start, end, break_end, lunch = row
+        return Slot(block_id, name, size,
+                    datetime.fromtimestamp(start),
+                    datetime.fromtimestamp(end),
+                    datetime.fromtimestamp(break_end),
+                    bool(lunch))
+
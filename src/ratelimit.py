@@ -0,0 +1,75 @@
+from collections import defaultdict
+from threading import Lock
+from time import monotonic, sleep
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# calls per minute Slack allows each app per workspace, by method
+# https://api.slack.com/docs/rate-limits
+TIER_2, TIER_3, TIER_4 = 20, 50, 100
+METHOD_LIMITS = {
+    "users.profile.get": TIER_4,
+    "users.profile.set": TIER_3,
+    "users.getPresence": TIER_3,
+    "users.setPresence": TIER_2,
+    "dnd.info": TIER_3,
+    "dnd.setSnooze": TIER_3,
+    "dnd.endSnooze": TIER_2,
+}
+DEFAULT_LIMIT = TIER_2
+
+
+class TokenBucket:
+    """Spaces calls out to stay under `per_minute` in any rolling minute.
+
+    Up to `burst` calls go out at once, after that tokens refill at
+    (per_minute - burst) a minute, so a full burst plus a minute of refills
+    never adds up to more than the limit.
+    """
+
+    def __init__(self, per_minute: int, burst: int = 5):
+        self.burst = max(1, min(burst, per_minute))
+        self.rate = max(per_minute - self.burst, 1) / 60
+        self._tokens = float(self.burst)
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """take a token, returning how many seconds to wait before using it"""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """block until a call may go out, returning the seconds waited"""
+        if (wait := self.reserve()) > 0:
+            sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """One `TokenBucket` per workspace and Slack method, shared by every client in the process."""
+
+    def __init__(self, burst: int = 5, limits: dict[str, int] | None = None):
+        self.burst = burst
+        self.limits = limits or METHOD_LIMITS
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+        self._lock = Lock()
+        self.waited: dict[str, float] = defaultdict(float)
+
+    def bucket(self, workspace: str, method: str) -> TokenBucket:
+        with self._lock:
+            if (bucket := self._buckets.get((workspace, method))) is None:
+                bucket = TokenBucket(self.limits.get(method, DEFAULT_LIMIT), burst=self.burst)
+                self._buckets[(workspace, method)] = bucket
+            return bucket
+
+    def acquire(self, workspace: str, method: str) -> None:
+        if (wait := self.bucket(workspace, method).acquire()) > 0:
+            logger.debug("Held %s for %s by %.2fs to stay under the rate limit", method, workspace, wait)
+            with self._lock:
+                self.waited[method] += wait
@@ -0,0 +1,116 @@
+from datetime import date, datetime, timedelta
+from logging import getLogger
+
+from .builder import Builder
+from .ingester import GoogleCalendarIngester
+from .models import Block, Day, Task
+from .plan_store import PlanStore
+
+logger = getLogger(__name__)
+
+
+class Replanner:
+    """Updates the persisted plan for a day instead of rebuilding it.
+
+    Blocks that already started are left alone. After that, the day is laid
+    out again around the current busy times and each new block takes over the
+    id, name and tasks of an old block of the same size that overlaps it, so
+    published block names stay put. Only tasks from blocks that disappeared,
+    tasks that changed and tasks new to the plan are packed again, into the
+    room left in the upcoming blocks.
+    """
+
+    def __init__(self, builder: Builder | None = None, store: PlanStore | None = None):
+        self.builder = builder or Builder()
+        self.store = store or PlanStore()
+
+    def replan(self, day: date, busy: list | None = None, now: datetime | None = None) -> Day:
+        """bring the stored plan for `day` up to date and save it"""
+        now = now or datetime.now()
+        if busy is None:
+            busy = GoogleCalendarIngester().get_busy_for_range(day, day)
+        tasks = {t.uuid: t for t in Task.get_tasks()}
+        previous = self.store.load(day)
+        if previous is None:
+            plan = self.builder._build_day(day, busy)
+            self.builder._assign_tasks_to_blocks(list(tasks.values()), plan)
+        else:
+            plan = self._update(previous, busy, tasks, now)
+        self.store.save(plan)
+        return plan
+
+    def _update(self, previous: Day, busy: list, tasks: dict[str, Task], now: datetime) -> Day:
+        started = [b for b in previous.blocks if b.start < now]
+        upcoming = [b for b in previous.blocks if b.start >= now]
+        day_start, day_end = self.builder._day_bounds(previous.date)
+        if started:
+            last = started[-1]
+            day_start = max(day_start, last.end + timedelta(minutes=last.break_size))
+        day_start = max(day_start, now)
+
+        # lunch is only laid out again if it has not started yet
+        gaps = self.builder._get_spaces_between_existing_events(day_start, day_end, self.builder._normalize_busy(busy))
+        layout = self.builder._layout_gaps(previous.date, gaps,
+                                           first_index=len(started),
+                                           lunch=not any(_is_lunch(b) for b in started))
+
+        unclaimed = list(upcoming)
+        evicted: list[Task] = []
+        blocks: list[Block] = []
+        for block in layout:
+            match = next((old for old in unclaimed
+                          if old.size == block.size and old.start < block.end and old.end > block.start
+                          and _is_lunch(old) == _is_lunch(block)),
+                         None)
+            if match:
+                unclaimed.remove(match)
+                block.id, block.name = match.id, match.name
+                for task in match.tasks:
+                    if "lunch" not in task.tags:
+                        block.add_task(task)
+            blocks.append(block)
+        for old in unclaimed:
+            logger.info(f"block {old.name} no longer fits, freeing its tasks")
+            evicted.extend(old.tasks)
+
+        # drop tasks that are done or changed size, and queue tasks new to the plan
+        planned = {t.uuid for b in started for t in b.tasks}
+        for block in blocks:
+            for task in list(block.tasks):
+                if "lunch" in task.tags:
+                    continue
+                current = tasks.get(task.uuid)
+                if current is None or current.points != task.points:
+                    block.remove_task(task)
+                    if current:
+                        evicted.append(current)
+                else:
+                    planned.add(task.uuid)
+        queued = {t.uuid for t in evicted if t.uuid in tasks and t.uuid not in planned}
+        new = {uuid for uuid in tasks if uuid not in planned} - queued
+        # partials only stay in consecutive blocks when their group is packed as a whole,
+        # so a displaced partial takes its upcoming siblings along
+        displaced = {tasks[uuid].partial_group for uuid in queued | new if tasks[uuid].partial_group}
+        for block in blocks:
+            for task in list(block.tasks):
+                if task.partial_group and task.partial_group in displaced:
+                    block.remove_task(task)
+                    planned.discard(task.uuid)
+                    queued.add(task.uuid)
+
+        for i, block in enumerate(started + blocks):
+            block.index = i
+        plan = Day(previous.date, blocks=started + blocks)
+        # built in `tasks` order, so equal partials keep their order within the group
+        queue = sorted((t for uuid, t in tasks.items() if uuid in queued or uuid in new),
+                       key=lambda t: (str(t.partial_group or ""), t.urgency, t.points),
+                       reverse=True)
+        if queue:
+            self.builder._assign_tasks_to_blocks(queue, Day(previous.date, blocks=blocks))
+        logger.info(f"replanned {previous.date}: kept {len(upcoming) - len(unclaimed)} of "
+                    f"{len(upcoming)} upcoming blocks, packed {len(queued)} moved and {len(new)} new tasks")
+        return plan
+
+
+def _is_lunch(block: Block) -> bool:
+    return any("lunch" in t.tags for t in block.tasks)
@@ -0,0 +1,302 @@
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import Thread
+from logging import getLogger
+
+from pydantic import BaseModel
+from taskw.utils import encode_task
+
+from .benchmark import synthetic_tasks
+from .fake_slack import FakeSlack
+from .repository import to_export, to_record
+
+logger = getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+HOOK = ROOT / "taskwarrior_hooks" / "on-modify.singularity"
+MODES = ("daemon", "oneshot")
+TOKEN = "xoxp-replay"
+USER = "UREPLAY"
+WRITES = ("users.profile.set", "dnd.setSnooze", "dnd.endSnooze", "users.setPresence")
+READS = ("users.profile.get", "dnd.info", "users.getPresence")
+
+
+class Event(BaseModel):
+    """one on-modify call: the task before and after, `delay` seconds after the previous event"""
+    old: dict
+    new: dict
+    delay: float = 0.0
+
+
+class Burst(BaseModel):
+    """how one burst of events played out"""
+    events: int
+    latency: float | None
+    hook_seconds: list[float]
+    writes: int
+    needed_writes: int
+    reads: int
+    correct: bool
+
+
+class ReplayReport(BaseModel):
+    mode: str
+    bursts: list[Burst]
+    rate_limited: int
+
+    def percentile(self, p: float) -> float | None:
+        """nearest rank percentile of the latency to the final status, in seconds.
+
+        only bursts that changed the status count, the rest have nothing to wait for.
+        """
+        latencies = sorted(b.latency for b in self.bursts if b.latency is not None and b.needed_writes)
+        if not latencies:
+            return None
+        return latencies[max(math.ceil(p / 100 * len(latencies)) - 1, 0)]
+
+    def hook_percentile(self, p: float) -> float:
+        """how long the hook held up taskwarrior, in seconds"""
+        hooks = sorted(s for b in self.bursts for s in b.hook_seconds)
+        return hooks[max(math.ceil(p / 100 * len(hooks)) - 1, 0)] if hooks else 0.0
+
+    @property
+    def redundant_writes(self) -> int:
+        return sum(max(b.writes - b.needed_writes, 0) for b in self.bursts)
+
+    @property
+    def wrong(self) -> int:
+        return sum(not b.correct for b in self.bursts)
+
+
+def synthetic_events(bursts: int = 20,
+                     burst_size: int = 3,
+                     tasks: int = 5,
+                     spacing: float = 0.05,
+                     seed: int = 0) -> tuple[list[dict], list[list[Event]]]:
+    """pending.data records and bursts of start/stop events on them.
+
+    Each burst starts or stops up to `burst_size` random tasks `spacing`
+    seconds apart, like switching from one task to the next or a script
+    touching several at once. Some tasks carry a public status.
+    """
+    rng = random.Random(seed)
+    records = synthetic_tasks(tasks, seed)
+    for n, record in enumerate(records):
+        record.pop("due", None)
+        if n % 2:
+            record["publictext"] = f"replay task {n}"
+    current = {r["uuid"]: to_export(r) for r in records}
+    stream = []
+    for _ in range(bursts):
+        burst = []
+        for n in range(rng.randint(1, burst_size)):
+            old = current[rng.choice(list(current))]
+            new = dict(old, modified=_now())
+            if new.get("start"):
+                del new["start"]
+            else:
+                new["start"] = _now()
+            current[new["uuid"]] = new
+            burst.append(Event(old=old, new=new, delay=spacing if n else 0.0))
+        stream.append(burst)
+    return records, stream
+
+
+def load_events(path: str | Path, gap: float = 2.0) -> tuple[list[dict], list[list[Event]]]:
+    """a recorded stream (json lines of old, new and delay) split into bursts at pauses over `gap` seconds"""
+    events = [Event(**json.loads(line)) for line in Path(path).read_text().splitlines() if line.strip()]
+    records = {}
+    for event in events:
+        records.setdefault(event.old.get("uuid"), to_record(event.old))
+    stream: list[list[Event]] = []
+    for event in events:
+        if not stream or event.delay > gap:
+            stream.append([])
+        stream[-1].append(event)
+    return list(records.values()), stream
+
+
+def _now() -> str:
+    return datetime.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+class Replay:
+    """Plays on-modify events through the real hook to Slack path and times it.
+
+    Taskwarrior's data dir and the Slack API are local stand ins (a temporary
+    pending.data and a `FakeSlack`); everything in between is the shipped
+    code. In "daemon" mode each event runs the actual hook script, which
+    hands it to an in process `SyncDaemon`. In "oneshot" mode each event
+    starts `slack --wait` in a fresh interpreter the way the hook's fallback
+    does (without the docker layer, which is not reproduced here). Like
+    taskwarrior, pending.data is only written once the hook returns.
+
+    For every burst the report has the time from its last event until Slack
+    first shows the final state, how many writes went out against how many
+    the change needed, and whether Slack still shows the right state once
+    everything has settled.
+    """
+
+    def __init__(self,
+                 mode: str = "daemon",
+                 debounce: float = 1.0,
+                 wait: int = 0,
+                 slack_latency: float = 0.05,
+                 timeout: float = 30.0,
+                 quiet: float | None = None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.debounce = debounce
+        self.wait = wait
+        self.slack_latency = slack_latency
+        self.timeout = timeout
+        self.quiet = quiet if quiet is not None else max(debounce, 0.5) + 0.5
+        self.tasks: dict[str, dict] = {}
+        self._processes: list[subprocess.Popen] = []
+
+    def run(self, records: list[dict], stream: list[list[Event]]) -> ReplayReport:
+        with tempfile.TemporaryDirectory() as workdir, \
+                FakeSlack({TOKEN: USER}, latency=self.slack_latency) as slack:
+            self.slack = slack
+            self.data = Path(workdir, "task")
+            self.state = Path(workdir, "state")
+            self.data.mkdir()
+            self.state.mkdir()
+            self.socket_path = Path(workdir, "singularity.sock")
+            self.tasks = {r["uuid"]: dict(r) for r in records}
+            self._write_tasks()
+            daemon = self._start_daemon() if self.mode == "daemon" else None
+            try:
+                bursts = [self._play(burst) for burst in stream]
+            finally:
+                if daemon:
+                    daemon.shutdown()
+                    daemon.server_close()
+                for process in self._processes:
+                    process.kill()
+            return ReplayReport(mode=self.mode, bursts=bursts, rate_limited=slack.count(status=429))
+
+    def env(self) -> dict[str, str]:
+        """the environment for the hook and any command it starts"""
+        return {**os.environ,
+                "PYTHONPATH": str(ROOT),
+                "STATE_DIR": str(self.state),
+                "TASK_DATA_LOCATION": str(self.data),
+                "SLACK_API_TOKEN": TOKEN,
+                "SLACK_USER_ID": USER,
+                "SLACK_BASE_URL": self.slack.base_url,
+                "SINGULARITY_SOCKET": str(self.socket_path)}
+
+    def _start_daemon(self):
+        from .daemon import SyncDaemon
+        from .plan_store import PlanStore
+        from .repository import TaskRepository
+        from .scheduler import Scheduler
+        from .slacker import Slacker, StatusCache, TimedWebClient
+
+        plans = PlanStore(self.state / "plans.sqlite3")
+        slacker = Slacker(USER,
+                          TimedWebClient(token=TOKEN, base_url=self.slack.base_url),
+                          repository=TaskRepository(self.data),
+                          plans=plans)
+        slacker.cache = StatusCache(self.state / f"slack_status_{USER}.json")
+        daemon = SyncDaemon(self.socket_path,
+                            slacker=slacker,
+                            debounce=self.debounce,
+                            scheduler=Scheduler(slacker, store=plans))
+        Thread(target=daemon.serve_forever, daemon=True).start()
+        return daemon
+
+    def _play(self, burst: list[Event]) -> Burst:
+        before = self.slack.status(USER)
+        first_call = len(self.slack.calls)
+        hook_seconds = []
+        started = time.perf_counter()
+        for event in burst:
+            time.sleep(event.delay)
+            started = time.perf_counter()
+            self._fire(event)
+            hook_seconds.append(time.perf_counter() - started)
+            self.tasks[event.new["uuid"]] = to_record(event.new)
+            self._write_tasks()
+        latency = self._until(self._matches, started)
+        self._settle()
+        after = self.slack.status(USER)
+        calls = self.slack.calls[first_call:]
+        return Burst(events=len(burst),
+                     latency=latency,
+                     hook_seconds=hook_seconds,
+                     writes=sum(c.method in WRITES for c in calls if c.status == 200),
+                     needed_writes=self._needed(before, after),
+                     reads=sum(c.method in READS for c in calls if c.status == 200),
+                     correct=self._matches())
+
+    def _fire(self, event: Event) -> None:
+        payload = f"{json.dumps(event.old)}\n{json.dumps(event.new)}\n"
+        if self.mode == "daemon":
+            subprocess.run([sys.executable, str(HOOK)], input=payload.encode(), env=self.env(),
+                           capture_output=True, check=False)
+        elif event.old.get("start") != event.new.get("start"):
+            self._processes.append(subprocess.Popen(
+                [sys.executable, "-m", "src.cli", "slack", "--wait", str(self.wait)],
+                cwd=ROOT, env=self.env(), start_new_session=True,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+    def _write_tasks(self) -> None:
+        pending = [r for r in self.tasks.values() if r.get("status", "pending") == "pending"]
+        path = self.data / "pending.data"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text("".join(encode_task(r) for r in pending))
+        tmp.replace(path)
+
+    def _expected(self) -> tuple[bool, set[str]]:
+        active = [r for r in self.tasks.values() if r.get("start") and r.get("status", "pending") == "pending"]
+        return bool(active), {r["publictext"] for r in active if r.get("publictext")} | {"focus work"}
+
+    def _matches(self) -> bool:
+        status = self.slack.status(USER)
+        active, parts = self._expected()
+        if not active:
+            return not status["status_text"] and not status["dnd"] and not status["away"]
+        text = status["status_text"].removeprefix("Working on: ")
+        return (status["status_text"].startswith("Working on: ") and set(text.split(" and ")) == parts
+                and status["status_emoji"] == ":computer:" and status["dnd"] and status["away"])
+
+    @staticmethod
+    def _needed(before: dict, after: dict) -> int:
+        """the fewest writes that get Slack from `before` to `after`"""
+        return sum(((before["status_text"], before["status_emoji"]) != (after["status_text"], after["status_emoji"]),
+                    before["dnd"] != after["dnd"],
+                    before["away"] != after["away"]))
+
+    def _until(self, condition, since: float) -> float | None:
+        while time.perf_counter() - since < self.timeout:
+            if condition():
+                return time.perf_counter() - since
+            time.sleep(0.005)
+        logger.warning("Slack did not reach the expected status within %ss", self.timeout)
+        return None
+
+    def _settle(self) -> None:
+        """wait until no process is left running and Slack has been quiet for a while"""
+        deadline = time.perf_counter() + self.timeout
+        last = (len(self.slack.calls), time.perf_counter())
+        while time.perf_counter() < deadline:
+            for process in self._processes:
+                if process.poll():
+                    logger.warning("`%s` exited with %s", " ".join(process.args[1:]), process.returncode)
+            self._processes = [p for p in self._processes if p.poll() is None]
+            if len(self.slack.calls) != last[0]:
+                last = (len(self.slack.calls), time.perf_counter())
+            elif not self._processes and time.perf_counter() - last[1] >= self.quiet:
+                return
+            time.sleep(0.01)
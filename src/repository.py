@@ -0,0 +1,246 @@
+import os
+import json
+import shutil
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from logging import getLogger
+from collections import defaultdict
+
+from pydantic import ValidationError
+from taskw.utils import decode_task, encode_task
+
+from .models import Task
+from .settings import CommonSettings
+from .timing import span, timed
+
+logger = getLogger(__name__)
+
+PRIORITY_URGENCY = {"H": 6.0, "M": 3.9, "L": 1.8}
+DATE_FIELDS = ("entry", "modified", "start", "end", "due", "wait", "scheduled", "until")
+
+
+def _as_datetime(value: str) -> datetime:
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value), tz=timezone.utc)
+    return datetime.strptime(value, "%Y%m%dT%H%M%S%z")
+
+
+def to_export(record: dict) -> dict:
+    """convert a pending.data record to the json `task import` expects"""
+    task = {}
+    annotations = []
+    for key, value in record.items():
+        if key.startswith("annotation_"):
+            annotations.append({"entry": _as_datetime(key.split("_", 1)[1]).strftime("%Y%m%dT%H%M%SZ"),
+                                "description": value})
+        elif key in DATE_FIELDS:
+            task[key] = _as_datetime(value).strftime("%Y%m%dT%H%M%SZ")
+        elif key == "depends":
+            task[key] = value.split(",") if isinstance(value, str) else value
+        else:
+            task[key] = value
+    if annotations:
+        task["annotations"] = annotations
+    return task
+
+
+def to_record(task: dict) -> dict:
+    """convert exported (or hook) task json back to a pending.data record"""
+    record = {}
+    for key, value in task.items():
+        if key == "annotations":
+            for annotation in value:
+                record[f"annotation_{int(_as_datetime(annotation['entry']).timestamp())}"] = annotation["description"]
+        elif key in DATE_FIELDS:
+            record[key] = str(int(_as_datetime(value).timestamp()))
+        elif key == "depends" and isinstance(value, list):
+            record[key] = ",".join(value)
+        elif key in ("id", "urgency"):
+            continue
+        else:
+            record[key] = value if isinstance(value, (str, list)) else str(value)
+    return record
+
+
+def urgency(record: dict, now: datetime | None = None) -> float:
+    """approximate taskwarrior's default urgency for a pending.data record.
+
+    the data file does not store urgency, so the main default coefficients
+    (next, due, priority, active, age, tags, project, annotations, waiting,
+    blocked) are recomputed here.
+    """
+    if "urgency" in record:
+        return float(record["urgency"])
+    now = now or datetime.now(tz=timezone.utc)
+    score = 0.0
+    tags = record.get("tags") or []
+    if "next" in tags:
+        score += 15.0
+    if due := record.get("due"):
+        days_overdue = (now - _as_datetime(due)).total_seconds() / 86400
+        if days_overdue >= 7:
+            score += 12.0
+        elif days_overdue >= -14:
+            score += 12.0 * (((days_overdue + 14) * 0.8 / 21) + 0.2)
+        else:
+            score += 12.0 * 0.2
+    score += PRIORITY_URGENCY.get(record.get("priority", ""), 0.0)
+    if record.get("start"):
+        score += 4.0
+    if entry := record.get("entry"):
+        age = (now - _as_datetime(entry)).days
+        score += 2.0 * min(age / 365, 1.0)
+    if tags:
+        score += {1: 0.8, 2: 0.9}.get(len(tags), 1.0)
+    if record.get("project"):
+        score += 1.0
+    annotations = len([k for k in record if k.startswith("annotation_")])
+    if annotations:
+        score += {1: 0.8, 2: 0.9}.get(annotations, 1.0)
+    if record.get("status") == "waiting":
+        score -= 3.0
+    if record.get("depends"):
+        score -= 5.0
+    return round(score, 4)
+
+
+class TaskRepository:
+    """Typed, indexed view of the pending taskwarrior tasks.
+
+    Reads `pending.data` in process rather than forking `task export`, and
+    only reloads when the file's modification time changes, so one planning
+    run shares a single snapshot however many queries it makes.
+    """
+    _default: "TaskRepository | None" = None
+
+    def __init__(self, data_location: str | Path | None = None):
+        data_location = data_location or CommonSettings().task_data_location
+        self.path = Path(data_location).expanduser() / "pending.data"
+        self._version: tuple[int, int] | None = None
+        self._records: list[dict] = []
+        self._by_uuid: dict[str, Task] = {}
+        self._active: list[Task] = []
+        self._by_partial_group: dict[str, list[Task]] = defaultdict(list)
+        self._by_tag: dict[str, list[Task]] = defaultdict(list)
+        self._by_urgency: list[Task] = []
+
+    @classmethod
+    def default(cls) -> "TaskRepository":
+        """the process wide repository for the configured data location"""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _current_version(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self, force: bool = False) -> None:
+        """reload the pending set if taskwarrior changed it since the last read"""
+        version = self._current_version()
+        if not force and version == self._version and self._version is not None:
+            return
+        self._load()
+        self._version = version
+
+    def invalidate(self) -> None:
+        self._version = None
+
+    @timed("taskwarrior.read")
+    def _load(self) -> None:
+        records = []
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                records = [decode_task(line) for line in f if line.strip()]
+        now = datetime.now(tz=timezone.utc)
+        self._records = records
+        self._by_uuid = {}
+        self._active = []
+        self._by_partial_group = defaultdict(list)
+        self._by_tag = defaultdict(list)
+        for record in records:
+            try:
+                task = Task(**{**record, "urgency": urgency(record, now)})
+            except ValidationError as e:
+                error = e.errors()[0]
+                logger.warning("Skipping task %s, %s: %s",
+                               record.get("uuid"), error["loc"][0], error["msg"])
+                continue
+            except ValueError as e:
+                # a date urgency() could not parse
+                logger.warning("Skipping task %s: %s", record.get("uuid"), e)
+                continue
+            self._by_uuid[task.uuid] = task
+            if task.start:
+                self._active.append(task)
+            if task.partial_group:
+                self._by_partial_group[str(task.partial_group)].append(task)
+            for tag in task.tags:
+                self._by_tag[tag].append(task)
+        self._by_urgency = sorted(self._by_uuid.values(), key=lambda t: t.urgency, reverse=True)
+        logger.info("Loaded %s pending tasks from %s", len(self._by_uuid), self.path)
+
+    def import_tasks(self, records: list[dict]) -> None:
+        """create or replace many tasks (matched by uuid) in a single write.
+
+        Uses one `task import` when the task binary is available, otherwise
+        rewrites pending.data once, the way taskw's direct backend does.
+        """
+        if shutil.which("task"):
+            with span("taskwarrior.import", api=True, tasks=len(records)):
+                subprocess.run(["task", "rc.verbose=nothing", "import", "-"],
+                               input=json.dumps([to_export(r) for r in records]),
+                               text=True,
+                               capture_output=True,
+                               check=True)
+        else:
+            self._write_direct(records)
+        logger.info("Imported %s tasks in one batch", len(records))
+        self.invalidate()
+
+    def _write_direct(self, records: list[dict]) -> None:
+        modified = str(int(datetime.now(tz=timezone.utc).timestamp()))
+        changed = {r["uuid"]: {**r, "modified": modified} for r in records}
+        merged = [changed.pop(r["uuid"], r) for r in self.records()]
+        merged.extend(changed.values())
+        tmp = self.path.with_suffix(".data.tmp")
+        with open(tmp, "w") as f:
+            f.writelines(encode_task(r) for r in merged)
+        os.replace(tmp, self.path)
+
+    def records(self) -> list[dict]:
+        """the raw pending.data records"""
+        self.refresh()
+        return self._records
+
+    def all(self) -> list[Task]:
+        self.refresh()
+        return list(self._by_uuid.values())
+
+    def get(self, uuid: str) -> Task | None:
+        self.refresh()
+        return self._by_uuid.get(uuid)
+
+    def active(self) -> list[Task]:
+        """tasks that have been started"""
+        self.refresh()
+        return list(self._active)
+
+    def by_partial_group(self, partial_group: str) -> list[Task]:
+        self.refresh()
+        return list(self._by_partial_group.get(str(partial_group), []))
+
+    def by_tag(self, tag: str) -> list[Task]:
+        self.refresh()
+        return list(self._by_tag.get(tag, []))
+
+    def by_urgency(self, minimum: float | None = None) -> list[Task]:
+        """tasks most urgent first, optionally only those at or above `minimum`"""
+        self.refresh()
+        if minimum is None:
+            return list(self._by_urgency)
+        return [t for t in self._by_urgency if t.urgency >= minimum]
@@ -0,0 +1,165 @@
+import heapq
+import itertools
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from logging import getLogger
+from threading import Condition, Event, Thread
+from typing import Callable, NamedTuple
+
+from .models import Task
+from .plan_store import PlanStore, Slot
+from .settings import PlannerSettings
+from .slacker import Slacker, Status
+
+logger = getLogger(__name__)
+
+
+class Kind(str, Enum):
+    block_start = "block_start"
+    break_start = "break_start"
+    lunch_start = "lunch_start"
+    end_of_day = "end_of_day"
+    next_day = "next_day"
+
+
+class Transition(NamedTuple):
+    at: datetime
+    kind: Kind
+    slot: Slot | None = None
+
+
+class Scheduler:
+    """Changes the Slack status at the boundaries of the day's plan.
+
+    Every upcoming block start, break, lunch and the end of the day sits in a
+    heap of timers, and one thread sleeps until the earliest is due. When a
+    plan changes only the blocks that moved are rescheduled: their old timers
+    are marked stale (and skipped when they come up) and new ones are pushed,
+    so a change costs O(log n) per block. At midnight the next day's plan is
+    loaded.
+    """
+    # wake up at least this often, so a suspended laptop or a clock change is noticed
+    max_wait: float = 60
+
+    def __init__(self,
+                 slacker: Slacker,
+                 store: PlanStore | None = None,
+                 now: Callable[[], datetime] = datetime.now):
+        self.slacker = slacker
+        self.store = store or PlanStore()
+        self.settings = PlannerSettings()
+        self.now = now
+        self.day: date | None = None
+        self._heap: list[tuple[datetime, int, int, Transition]] = []
+        self._slots: dict[str, Slot] = {}
+        self._tokens: dict[str | None, int] = {}
+        self._order = itertools.count()
+        self._cond = Condition()
+        self._stop = Event()
+
+    def start(self) -> Thread:
+        thread = Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+
+    def reload(self, day: date | None = None) -> None:
+        """pick up the stored plan for `day` (default today), rescheduling only blocks that changed"""
+        day = day or self.now().date()
+        with self._cond:
+            if day != self.day:
+                self.day = day
+                self._heap.clear()
+                self._slots = {}
+                self._tokens = {}
+                self._push(None, Transition(datetime.combine(day, time.fromisoformat(self.settings.end_time)),
+                                            Kind.end_of_day))
+                self._push(None, Transition(datetime.combine(day + timedelta(days=1), time()), Kind.next_day))
+            slots = {s.block_id: s for s in self.store.slots(day)}
+            moved = 0
+            for block_id in self._slots.keys() - slots.keys():
+                self._tokens[block_id] += 1
+            for block_id, slot in slots.items():
+                if self._slots.get(block_id) != slot:
+                    self._tokens[block_id] = self._tokens.get(block_id, 0) + 1
+                    for transition in self._transitions(slot):
+                        self._push(block_id, transition)
+                    moved += 1
+            self._slots = slots
+            self._cond.notify()
+        logger.info("Scheduled %s changed blocks for %s", moved, day)
+
+    def _transitions(self, slot: Slot) -> list[Transition]:
+        return [Transition(slot.start, Kind.lunch_start if slot.lunch else Kind.block_start, slot),
+                Transition(slot.end, Kind.break_start, slot)]
+
+    def _push(self, block_id: str | None, transition: Transition) -> None:
+        if transition.at < self.now():
+            return
+        heapq.heappush(self._heap, (transition.at, next(self._order), self._tokens.get(block_id, 0), transition))
+
+    def _stale(self, token: int, transition: Transition) -> bool:
+        block_id = transition.slot.block_id if transition.slot else None
+        return token != self._tokens.get(block_id, 0)
+
+    def run(self) -> None:
+        """fire transitions as they come due until stopped"""
+        if self.day is None:
+            self.reload()
+        while not self._stop.is_set():
+            with self._cond:
+                while self._heap and self._stale(self._heap[0][2], self._heap[0][3]):
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = (self._heap[0][0] - self.now()).total_seconds()
+                if wait > 0:
+                    self._cond.wait(min(wait, self.max_wait))
+                    continue
+                transition = heapq.heappop(self._heap)[3]
+            self.fire(transition)
+
+    def fire(self, transition: Transition) -> None:
+        logger.info("%s at %s", transition.kind.value, transition.at)
+        try:
+            if transition.kind == Kind.next_day:
+                self.reload(transition.at.date())
+            elif transition.kind == Kind.block_start or self._working_through(transition):
+                self.slacker.update_statuses_based_on_current_state()
+            elif status := self.status_for(transition):
+                self.slacker.set_status(status)
+        except ValueError as e:
+            logger.error("Failed to update Slack status: %s", e)
+
+    def _working_through(self, transition: Transition) -> bool:
+        """a break with a task still running, which keeps the working status rather than flapping to the break"""
+        return transition.kind == Kind.break_start and bool(Task.get_active_tasks(self.slacker.repository))
+
+    def status_for(self, transition: Transition) -> Status | None:
+        if transition.kind == Kind.lunch_start:
+            return Status(status_text="Lunch",
+                          status_emoji=":fork_and_knife:",
+                          status_expiration=round(transition.slot.end.timestamp()),
+                          dnd=True,
+                          dnd_expiration=round(transition.slot.end.timestamp()),
+                          away=True)
+        if transition.kind == Kind.break_start:
+            return Status(status_text="On a break",
+                          status_emoji=":coffee:",
+                          status_expiration=round(transition.slot.break_end.timestamp()),
+                          dnd=False,
+                          dnd_expiration=0,
+                          away=False)
+        if transition.kind == Kind.end_of_day:
+            return Status(status_text="",
+                          status_emoji="",
+                          status_expiration=0,
+                          dnd=False,
+                          dnd_expiration=0,
+                          away=True)
+        return None
@@ -7,10 +7,19 @@ class BlockSize(str, Enum):
     big = "big"
 
 
-class Settings(BaseSettings):
-    """Settings for the application"""
+class CommonSettings(BaseSettings):
+    """Where things live, shared by every part of the application"""
+    socket_path: str = "~/.task/singularity.sock"
+    state_dir: str = "~/.task/singularity"
+    task_data_location: str = "~/.task"
+    debounce_seconds: float = 1.0
+
+
+class PlannerSettings(CommonSettings):
+    """Settings for laying out blocks and packing tasks"""
     start_time: str = "09:00"
     end_time: str = "17:00"
+    work_days: list[int] = [0, 1, 2, 3, 4]
     small_block_size: int = 25
     medium_block_size: int = 50
     big_block_size: int = 80
@@ -24,10 +33,45 @@ class Settings(BaseSettings):
     lunch: bool = True
     lunch_size: BlockSize = BlockSize.medium
     lunch_aprox_start: str = "12:00"
+    packing_strategy: str = "best_fit"
+    packing_time_budget: float = 0.5
+
+
+class ImapSettings(CommonSettings):
+    """Settings for reading email"""
     imap_host: str
     imap_port: int
     imap_username: str
     imap_password: str
+    imap_chunk_size: int = 100
+    imap_pool_size: int = 4
+    imap_keepalive: int = 300
+    imap_idle_timeout: int = 1500
+    imap_idle_wait: int = 600
+
+
+class SlackTeamSettings(CommonSettings):
+    """Settings for the Slack status sync that do not depend on whose status it is"""
+    slack_base_url: str = "https://slack.com/api/"
+    slack_max_retries: int = 3
+    slack_rate_burst: int = 5
+    slack_team_workers: int = 16
+    status_expiration_tolerance: int = 300
+
+
+class SlackSettings(SlackTeamSettings):
+    """Settings for the Slack status sync"""
     slack_api_token: str
     slack_user_id: str
-    calendar_email:str
\ No newline at end of file
+
+
+class CalendarSettings(CommonSettings):
+    """Settings for the calendar"""
+    calendar_email:str
+    calendar_cache_ttl: int = 900
+    calendar_sync_pages: int = 4
+
+
+class Settings(PlannerSettings, ImapSettings, SlackSettings, CalendarSettings):
+    """Settings for the application. Prefer the scoped settings above, which
+    only require the environment their part of the application needs"""
\ No newline at end of file
@@ -1,11 +1,20 @@
+import time
 from logging import getLogger, StreamHandler
 from datetime import datetime, timedelta, date
+from pathlib import Path
+from threading import Lock
+from typing import Callable, TYPE_CHECKING
 from pydantic import BaseModel
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
 from .models import Task
-from .settings import Settings
+from .plan_store import PlanStore
+from .settings import PlannerSettings, SlackSettings, SlackTeamSettings
+from .timing import span, timed
+
+if TYPE_CHECKING:
+    from .repository import TaskRepository
 
 
 logger = getLogger(__name__)
@@ -25,22 +34,113 @@ class Status(BaseModel):
             "status_expiration": self.status_expiration,
         }
 
+    def presence(self) -> str:
+        return "away" if self.away else "auto"
+
+    def changes(self, applied: "Status | None", tolerance: int = 0) -> set[str]:
+        """the Slack writes ("profile", "dnd", "presence") needed to get from applied to this status.
+
+        expirations that moved by no more than `tolerance` seconds are not worth a write.
+        """
+        if applied is None:
+            return {"profile", "dnd", "presence"}
+
+        def drifted(a: int | None, b: int | None) -> bool:
+            return abs((a or 0) - (b or 0)) > tolerance
+
+        changes = set()
+        if (self.status_text, self.status_emoji) != (applied.status_text, applied.status_emoji) \
+                or drifted(self.status_expiration, applied.status_expiration):
+            changes.add("profile")
+        if bool(self.dnd) != bool(applied.dnd) \
+                or (self.dnd and drifted(self.dnd_expiration, applied.dnd_expiration)):
+            changes.add("dnd")
+        if self.presence() != applied.presence():
+            changes.add("presence")
+        return changes
+
+
+class StatusCache:
+    """The last Status applied to Slack, kept in memory and persisted to disk."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self._status: Status | None = None
+        if self.path.exists():
+            try:
+                self._status = Status.model_validate_json(self.path.read_text())
+            except ValueError:
+                logger.warning("Ignoring unreadable status cache at %s", self.path)
+
+    def get(self) -> Status | None:
+        return self._status
+
+    def store(self, status: Status) -> None:
+        self._status = status
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(status.model_dump_json())
+
+    def update(self, status: Status, fields: set[str]) -> None:
+        """record that only the given fields of status reached Slack"""
+        current = self._status.model_dump() if self._status else {}
+        current.update(status.model_dump(include=fields))
+        self.store(Status(**current))
+
+class TimedWebClient(WebClient):
+    """a WebClient that records a timing span for every Slack API call"""
+
+    def api_call(self, api_method: str, **kwargs):
+        with span(f"slack.{api_method}", api=True):
+            return super().api_call(api_method, **kwargs)
+
 class Slacker:
-    """A slack manager for the Sinularity project."""
+    """A slack manager for the Sinularity project.
 
-    def __init__(self):
-        try:
-            self.settings = Settings()
-            self.client = WebClient(token=self.settings.slack_api_token)
-        except KeyError:
-            raise ValueError("SLACK_API_TOKEN environment variable not set.")
+    Manages the user and token from the SLACK_* settings by default. Passing
+    `user_id` and `client` manages someone else, as `Team` does for each of
+    its members; their tasks and plans come from `repository` and `plans`.
+    """
+
+    FIELDS = {
+        "profile": {"status_text", "status_emoji", "status_expiration"},
+        "dnd": {"dnd", "dnd_expiration"},
+        "presence": {"away"},
+    }
+
+    def __init__(self,
+                 user_id: str | None = None,
+                 client: WebClient | None = None,
+                 repository: "TaskRepository | None" = None,
+                 plans: PlanStore | None = None):
+        if client is None:
+            try:
+                self.settings = SlackSettings()
+                client = TimedWebClient(token=self.settings.slack_api_token,
+                                        base_url=self.settings.slack_base_url)
+            except KeyError:
+                raise ValueError("SLACK_API_TOKEN environment variable not set.")
+            user_id = user_id or self.settings.slack_user_id
+        elif user_id is None:
+            raise ValueError("A user_id is needed along with a client.")
+        else:
+            self.settings = SlackTeamSettings()
+        self.client = client
+        self.user_id = user_id
+        self.repository = repository
+        self.planner = PlannerSettings()
+        self.plans = plans or PlanStore()
+        self.cache = StatusCache(
+            Path(self.settings.state_dir) / f"slack_status_{self.user_id}.json")
+        self._lock = Lock()
+        self._desired: Status | None = None
 
+    @timed("slack.get_status")
     def get_status(self):
         """Get the status of the target user."""
         try:
-            profile = self.client.users_profile_get(user=self.settings.slack_user_id)
-            dnd = self.client.dnd_info(user=self.settings.slack_user_id).data
-            away = self.client.users_getPresence(user=self.settings.slack_user_id).data
+            profile = self.client.users_profile_get(user=self.user_id)
+            dnd = self.client.dnd_info(user=self.user_id).data
+            away = self.client.users_getPresence(user=self.user_id).data
 
             return Status(**profile["profile"],
                           dnd=dnd["snooze_enabled"],
@@ -49,30 +149,79 @@ class Slacker:
         except SlackApiError as e:
             raise ValueError(f"Error fetching status: {e}")
 
-    def set_status(self, status: "Status"):
-        """Set the status and DND for the target user."""
-        try:
-            self.client.users_profile_set(user=self.settings.slack_user_id,
+    @timed("slack.set_status")
+    def set_status(self, status: "Status", force: bool = False):
+        """Set the status and DND for the target user.
+
+        Only the writes that differ from the last applied status are made.
+        When Slack rate limits us we back off and retry with whatever status
+        is newest by then, so concurrent callers coalesce into one update.
+        """
+        self._desired = status
+        with self._lock:
+            for attempt in range(self.settings.slack_max_retries + 1):
+                desired = self._desired
+                if desired is None:
+                    logger.info("Status already applied by a newer update.")
+                    return
+                try:
+                    self._apply(desired, force)
+                except SlackApiError as e:
+                    if e.response.status_code != 429 or attempt == self.settings.slack_max_retries:
+                        raise ValueError(f"Error setting status: {e}")
+                    delay = max(int(e.response.headers.get("Retry-After", 1)), 2 ** attempt)
+                    logger.warning("Rate limited by Slack, retrying in %s seconds.", delay)
+                    time.sleep(delay)
+                    continue
+                if self._desired is desired:
+                    self._desired = None
+                return
+
+    def _apply(self, status: "Status", force: bool = False) -> None:
+        """make the Slack writes that differ from the cached status"""
+        if not force and self.cache.get() is None:
+            self.cache.store(self.get_status())
+        applied = None if force else self.cache.get()
+        changes = status.changes(applied, self.settings.status_expiration_tolerance)
+        if not changes:
+            logger.info("Slack status is already up to date.")
+            return
+        if "profile" in changes and self._desired is status:
+            self.client.users_profile_set(user=self.user_id,
                                           profile=status.profile())
+            self.cache.update(status, self.FIELDS["profile"])
+        if "dnd" in changes and self._desired is status:
             if status.dnd:
                 delta = (status.dnd_expiration - datetime.now().timestamp()) // 60
                 logger.info("Setting DND for %s minutes.", delta)
                 self.client.dnd_setSnooze(num_minutes=delta)
             else:
                 self.client.dnd_endSnooze()
-            away_status = "away" if status.away else "auto"
-            self.client.users_setPresence(presence=away_status)
-        except SlackApiError as e:
-            raise ValueError(f"Error setting status: {e}")
+            self.cache.update(status, self.FIELDS["dnd"])
+        if "presence" in changes and self._desired is status:
+            self.client.users_setPresence(presence=status.presence())
+            self.cache.update(status, self.FIELDS["presence"])
+
+    def update_statuses_based_on_current_state(self,
+                                               changed: dict[str, dict] | None = None,
+                                               is_current: Callable[[], bool] | None = None)-> None:
+        """Update the statuses based on the current state.
 
-    def update_statuses_based_on_current_state(self)-> None:
-        """Update the statuses based on the current state."""
+        `changed` holds task json from hooks that taskwarrior may not have
+        written yet, keyed by uuid; it wins over what taskwarrior reports.
+        Nothing is sent if `is_current` says a newer update has taken over.
+        """
         logger.info("Checking for active tasks...")
-        if tasks := Task.get_active_tasks():
-            #TODO: Get real timeline based on blocks
-            end_time = datetime.now() + timedelta(minutes=self.settings.big_block_size)
+        tasks = Task.get_active_tasks(self.repository)
+        if changed:
+            tasks = [t for t in tasks if t.uuid not in changed]
+            tasks += [Task(**t) for t in changed.values() if t.get("start")]
+        if tasks:
+            # hold the status until the planned block ends, or a big block's worth without a plan
+            block = self.plans.block_at()
+            end_time = block.end if block else datetime.now() + timedelta(minutes=self.planner.big_block_size)
             logger.info("Found %s active tasks.", len(tasks))
-            message = set([t.public_status for t in tasks]) | {"focus work",}
+            message = set([t.public_status for t in tasks if t.public_status]) | {"focus work",}
             logger.info("setting status to: %s", message)
             status = Status(
                 status_text=f"Working on: {' and '.join(message)}",
@@ -90,6 +239,9 @@ class Slacker:
                 dnd=False,
                 dnd_expiration=0,
                 away=False,)
+        if is_current and not is_current():
+            logger.info("A newer update is in flight, dropping this one.")
+            return
         logger.info("updating status...")
         self.set_status(status)
         logger.info("Successfully set Slack status to reflect current state.")
\ No newline at end of file
@@ -0,0 +1,104 @@
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Thread
+from typing import Iterator
+
+from pydantic import BaseModel
+
+ROOT = Path(__file__).resolve().parent.parent
+HOOK = ROOT / "taskwarrior_hooks" / "on-modify.singularity"
+# a task being started, as taskwarrior hands it to the on-modify hook
+HOOK_EVENT = (json.dumps({"uuid": "startup-check", "description": "startup check"}) + "\n"
+              + json.dumps({"uuid": "startup-check", "description": "startup check",
+                            "start": "20240101T090000Z"}) + "\n")
+
+# what `singularity slack`, the hook's fallback without a daemon, runs before its first Slack API call
+SLACK_PATH = """
+import time
+started = time.perf_counter()
+from src.slacker import Slacker
+Slacker()
+print(time.perf_counter() - started)
+"""
+
+
+class StartupReport(BaseModel):
+    seconds: float
+    imports: list[tuple[str, float]]
+
+    def over(self, budget_ms: float) -> bool:
+        return self.seconds * 1000 > budget_ms
+
+
+class _StubHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.rfile.readline()
+        self.rfile.readline()
+        self.wfile.write(b"ok\n")
+
+
+@contextmanager
+def _stub_daemon(socket_path: Path) -> Iterator[Path]:
+    """a socket that answers like the sync daemon, so only the hook's own cost is timed"""
+    server = socketserver.UnixStreamServer(str(socket_path), _StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield socket_path
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _run(what: str, args: list[str], **kwargs) -> subprocess.CompletedProcess:
+    """run a timed interpreter, turning its failure into a ValueError naming the last error line"""
+    try:
+        return subprocess.run(args, cwd=ROOT, capture_output=True, text=True, check=True, **kwargs)
+    except (OSError, subprocess.CalledProcessError) as e:
+        lines = [line.strip() for line in (getattr(e, "stderr", None) or str(e)).splitlines()
+                 if line.strip() and "errors.pydantic.dev" not in line]
+        raise ValueError(f"{what} failed: {lines[-1] if lines else e}")
+
+
+def _imports(stderr: str, top: int) -> list[tuple[str, float]]:
+    """the slowest imports (self time, ms) from -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "self" not in line:
+            own, _, name = line.removeprefix("import time:").split("|")
+            imports.append((name.strip(), int(own) / 1000))
+    return sorted(imports, key=lambda i: -i[1])[:top]
+
+
+def measure_hook(runs: int = 5, top: int = 10) -> StartupReport:
+    """the best wall time of the on-modify hook handing a change to a running daemon.
+
+    This is what taskwarrior waits on for every start and stop: a fresh
+    interpreter, the hook script and one socket round trip.
+    """
+    with tempfile.TemporaryDirectory() as tmp, _stub_daemon(Path(tmp, "singularity.sock")) as socket_path:
+        env = {**os.environ, "SINGULARITY_SOCKET": str(socket_path)}
+
+        def run(*flags: str) -> tuple[float, subprocess.CompletedProcess]:
+            started = time.perf_counter()
+            result = _run("the hook", [sys.executable, *flags, str(HOOK)], input=HOOK_EVENT, env=env)
+            if "Sent new task status" not in result.stdout:
+                raise ValueError(f"the hook did not hand the change to the daemon: {result.stdout.strip()}")
+            return time.perf_counter() - started, result
+
+        best = min(run()[0] for _ in range(runs))
+        return StartupReport(seconds=best, imports=_imports(run("-X", "importtime")[1].stderr, top))
+
+
+def measure(code: str = SLACK_PATH, runs: int = 5, top: int = 10) -> StartupReport:
+    """the best time for `code` in a fresh interpreter, and its slowest imports (self time, ms)"""
+    best = min(float(_run("the timed code", [sys.executable, "-c", code]).stdout.split()[-1]) for _ in range(runs))
+    # -X importtime slows imports down, so it only gets one separate run
+    imports = _run("the timed code", [sys.executable, "-X", "importtime", "-c", code]).stderr
+    return StartupReport(seconds=best, imports=_imports(imports, top))
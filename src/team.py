@@ -0,0 +1,111 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from logging import getLogger
+from pydantic import BaseModel, ValidationError
+
+from .plan_store import PlanStore
+from .ratelimit import RateLimiter
+from .repository import TaskRepository
+from .settings import SlackTeamSettings
+from .slacker import Slacker, Status, TimedWebClient
+
+logger = getLogger(__name__)
+
+
+class RateLimitedWebClient(TimedWebClient):
+    """a WebClient that waits for its workspace's rate limit before every call"""
+
+    def __init__(self, limiter: RateLimiter, workspace: str, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.workspace = workspace
+
+    def api_call(self, api_method: str, **kwargs):
+        self.limiter.acquire(self.workspace, api_method)
+        return super().api_call(api_method, **kwargs)
+
+
+class Member(BaseModel):
+    """someone whose Slack status the team service keeps in sync"""
+    user_id: str
+    token: str
+    workspace: str = "default"
+    task_data_location: str
+    state_dir: str
+
+
+class Team:
+    """Keeps the Slack status of a whole team in sync from one process.
+
+    Every member gets their own `Slacker` with their own token, and updates
+    for different members run concurrently on a thread pool. All clients
+    share one `RateLimiter`, so however many members change state at once,
+    each workspace stays under Slack's per method limits and calls are held
+    back instead of answered with a 429.
+    """
+
+    def __init__(self,
+                 members: list[Member],
+                 limiter: RateLimiter | None = None,
+                 base_url: str | None = None,
+                 workers: int | None = None):
+        self.settings = SlackTeamSettings()
+        self.members = {m.user_id: m for m in members}
+        self.limiter = limiter or RateLimiter(burst=self.settings.slack_rate_burst)
+        self.base_url = base_url or self.settings.slack_base_url
+        self.workers = workers or self.settings.slack_team_workers
+        self._slackers: dict[str, Slacker] = {}
+
+    @classmethod
+    def load(cls, path: str | Path | None = None, **kwargs) -> "Team":
+        """read the members from a JSON list, state_dir/team.json by default"""
+        path = Path(path or Path(SlackTeamSettings().state_dir) / "team.json").expanduser()
+        if not path.exists():
+            logger.warning("No team members at %s", path)
+            return cls([], **kwargs)
+        members = []
+        for entry in json.loads(path.read_text()):
+            try:
+                members.append(Member(**entry))
+            except ValidationError as e:
+                error = e.errors()[0]
+                logger.warning("Skipping team member %s, %s: %s",
+                               entry.get("user_id"), error["loc"][0], error["msg"])
+        return cls(members, **kwargs)
+
+    def slacker(self, user_id: str) -> Slacker:
+        if (slacker := self._slackers.get(user_id)) is None:
+            member = self.members[user_id]
+            client = RateLimitedWebClient(self.limiter, member.workspace,
+                                          token=member.token,
+                                          base_url=self.base_url)
+            slacker = self._slackers[user_id] = Slacker(
+                user_id, client,
+                repository=TaskRepository(member.task_data_location),
+                plans=PlanStore(Path(member.state_dir).expanduser() / "plans.sqlite3"))
+        return slacker
+
+    def set_statuses(self, statuses: dict[str, Status]) -> dict[str, str]:
+        """apply each member's status concurrently, returning the errors by user id"""
+        return self._fan_out({user_id: partial(self.slacker(user_id).set_status, status)
+                              for user_id, status in statuses.items()})
+
+    def sync(self, user_ids: list[str] | None = None) -> dict[str, str]:
+        """update every (or the given) member's status from their tasks, returning the errors by user id"""
+        return self._fan_out({user_id: self.slacker(user_id).update_statuses_based_on_current_state
+                              for user_id in user_ids or self.members})
+
+    def _fan_out(self, jobs: dict) -> dict[str, str]:
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {user_id: pool.submit(job) for user_id, job in jobs.items()}
+            for user_id, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    # one member's failure, whatever it is, must not hold up the rest of the team
+                    logger.error("Failed to update Slack status for %s: %s", user_id, e)
+                    errors[user_id] = str(e)
+        return errors
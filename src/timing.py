@@ -0,0 +1,89 @@
+import functools
+import json
+import time
+from contextlib import contextmanager
+from logging import getLogger
+from threading import Lock
+from typing import Callable, Iterator
+
+logger = getLogger(__name__)
+
+
+class Profile:
+    """Totals of every span finished while it is active, per span name.
+
+    Spans marked `api` are calls to an outside service (Slack, Google, IMAP,
+    the task binary) and are counted separately in the report. Totals include
+    nested spans, so shares can add up to more than the whole.
+    """
+
+    def __init__(self, startup: float = 0.0):
+        self.started = time.perf_counter()
+        self.startup = startup
+        self.totals: dict[str, list] = {}
+        self._lock = Lock()
+
+    def add(self, name: str, seconds: float, api: bool) -> None:
+        with self._lock:
+            total = self.totals.setdefault(name, [0, 0.0, api])
+            total[0] += 1
+            total[1] += seconds
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started + self.startup
+        lines = [f"{'span':<32} {'calls':>5} {'total':>10} {'share':>6}"]
+        if self.startup:
+            lines.append(f"{'startup (cpu)':<32} {'':>5} {self.startup * 1000:>8.1f}ms {self.startup / elapsed:>6.0%}")
+        for name, (count, seconds, api) in sorted(self.totals.items(), key=lambda t: -t[1][1]):
+            lines.append(f"{name + (' *' if api else ''):<32} {count:>5} "
+                         f"{seconds * 1000:>8.1f}ms {seconds / elapsed:>6.0%}")
+        calls = sum(count for count, _, api in self.totals.values() if api)
+        lines.append(f"{calls} external api calls (*), {elapsed * 1000:.1f}ms profiled")
+        return "\n".join(lines)
+
+
+_profile: Profile | None = None
+
+
+def start_profile(startup: float = 0.0) -> Profile:
+    """collect every span from here on into a new Profile"""
+    global _profile
+    _profile = Profile(startup)
+    return _profile
+
+
+def stop_profile() -> Profile | None:
+    global _profile
+    profile, _profile = _profile, None
+    return profile
+
+
+@contextmanager
+def span(name: str, api: bool = False, **fields) -> Iterator[None]:
+    """time a block of code and log it as one json line on this module's logger"""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        if _profile is not None:
+            _profile.add(name, seconds, api)
+        logger.debug(json.dumps({"span": name, "ms": round(seconds * 1000, 3), "api": api,
+                                 **({"error": error} if error else {}), **fields}, default=str))
+
+
+def timed(name: str | None = None, api: bool = False) -> Callable:
+    """decorator form of `span`, named after the function by default"""
+    def decorator(fn: Callable) -> Callable:
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label, api=api):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,59 @@
+from time import monotonic
+from threading import Condition, Thread
+from typing import Callable
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class UpdateQueue:
+    """Folds bursts of on-modify events into a single update.
+
+    Events are collected until `debounce` seconds pass without a new one, then
+    `apply` is called once with the final state of every task in the burst,
+    keyed by uuid. Each burst runs on its own thread with an increasing
+    generation number so a newer burst can supersede one still in flight;
+    `apply` should bail out once `is_current(generation)` turns False.
+    """
+
+    def __init__(self,
+                 apply: Callable[[dict[str, dict], int], None],
+                 debounce: float = 1.0):
+        self.apply = apply
+        self.debounce = debounce
+        self.generation = 0
+        self._pending: dict[str, dict] = {}
+        self._last_event = 0.0
+        self._cond = Condition()
+        self._worker = Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def put(self, task: dict) -> None:
+        """add the new state of a modified task to the current burst"""
+        with self._cond:
+            self._pending[task.get("uuid", task.get("description"))] = task
+            self._last_event = monotonic()
+            self._cond.notify()
+
+    def is_current(self, generation: int) -> bool:
+        """False once a newer burst has been handed off"""
+        return generation == self.generation
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while (remaining := self._last_event + self.debounce - monotonic()) > 0:
+                    self._cond.wait(remaining)
+                burst, self._pending = self._pending, {}
+                self.generation += 1
+                generation = self.generation
+            logger.info("Applying %s folded task changes.", len(burst))
+            Thread(target=self._apply, args=(burst, generation), daemon=True).start()
+
+    def _apply(self, burst: dict[str, dict], generation: int) -> None:
+        try:
+            self.apply(burst, generation)
+        except Exception as e:
+            logger.error("Failed to apply task changes: %s", e)
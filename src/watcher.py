@@ -0,0 +1,152 @@
+import asyncio
+import json
+import re
+from pathlib import Path
+from logging import getLogger
+from threading import Event
+from typing import AsyncIterator
+
+from imap_tools import MailMessage
+from pydantic import BaseModel
+
+from .dedupe import DedupeIndex
+from .imap_pool import CONNECTION_ERRORS
+from .ingester import EmailIngester, GmailIngester
+from .pipeline import AsyncIngester, IngestItem
+from .repository import TaskRepository
+from .settings import ImapSettings
+
+logger = getLogger(__name__)
+
+
+class Rule(BaseModel):
+    """turns matching email into a task. every condition that is set has to match"""
+    name: str
+    sender: str | None = None
+    subject: str | None = None
+    labels: list[str] = []
+    tags: list[str] = []
+    points: int = 1
+    project: str | None = None
+
+    def matches(self, message: MailMessage, labels: set[str]) -> bool:
+        if self.sender and not re.search(self.sender, message.from_, re.IGNORECASE):
+            return False
+        if self.subject and not re.search(self.subject, message.subject):
+            return False
+        return set(self.labels) <= labels
+
+
+class RuleSet:
+    """An ordered list of rules, read from a JSON file. The first match wins."""
+
+    def __init__(self, rules: list[Rule]):
+        self.rules = rules
+
+    @classmethod
+    def load(cls, path: str | Path | None = None) -> "RuleSet":
+        path = Path(path or Path(ImapSettings().state_dir) / "email_rules.json").expanduser()
+        if not path.exists():
+            logger.warning("No email rules at %s, nothing will become a task", path)
+            return cls([])
+        return cls([Rule(**r) for r in json.loads(path.read_text())])
+
+    def match(self, message: MailMessage, labels: set[str]) -> Rule | None:
+        return next((r for r in self.rules if r.matches(message, labels)), None)
+
+
+class MailWatcher:
+    """Creates tasks from new mail within seconds of it arriving.
+
+    A pooled session sits in IMAP IDLE on one folder. When the server reports
+    new messages, only the UIDs past the folder checkpoint are fetched, and
+    only the headers the rules need. Each match becomes a task, and a wake-up
+    is imported into taskwarrior as one batch. Task uuids come from the
+    Message-ID, and like the pipeline, messages already in the dedupe index
+    are skipped, so a message seen again (after the server renumbered the
+    folder, or the checkpoint was lost) never reopens or duplicates its task.
+    """
+    HEADERS = ["FROM", "SUBJECT", "DATE", "MESSAGE-ID"]
+
+    def __init__(self,
+                 ingester: EmailIngester | None = None,
+                 rules: RuleSet | None = None,
+                 repository: TaskRepository | None = None,
+                 index: DedupeIndex | None = None,
+                 folder: str | None = None,
+                 idle_wait: int | None = None):
+        self.ingester = ingester or GmailIngester()
+        self.rules = rules or RuleSet.load()
+        self.repository = repository or TaskRepository.default()
+        self._index = index
+        self.folder = folder or self.ingester.ALL_MAILBOX
+        self.idle_wait = idle_wait or ImapSettings().imap_idle_wait
+
+    def run(self, stop: Event | None = None) -> None:
+        """watch until `stop` is set"""
+        stop = stop or Event()
+        self.drain()
+        while not stop.is_set():
+            try:
+                with self.ingester.conn as mailbox:
+                    mailbox.folder.set(self.folder)
+                    responses = mailbox.idle.wait(timeout=self.idle_wait)
+                if any(r.endswith(b"EXISTS") for r in responses):
+                    self.drain()
+            except CONNECTION_ERRORS as e:
+                logger.warning("IMAP watch interrupted (%s), reconnecting", e)
+
+    @property
+    def index(self) -> DedupeIndex:
+        # opened on first use, from the thread that drains
+        if self._index is None:
+            self._index = DedupeIndex()
+        return self._index
+
+    def drain(self) -> list[dict]:
+        """turn every new matching message into a task, returning the records filed"""
+        unfiled, changed = self.index.changes(self.items(self.folder))
+        records = [i.record() for i in unfiled if self.repository.get(i.uuid) is None]
+        if records:
+            self.repository.import_tasks(records)
+        if unfiled or changed:
+            self.index.upsert(unfiled + changed)
+        return records
+
+    def items(self, folder: str) -> list[IngestItem]:
+        """the new messages in a folder that match a rule"""
+        items = []
+        for message in self.ingester.stream_new_emails(folder, headers=self.HEADERS):
+            rule = self.rules.match(message, self.ingester.labels(message))
+            if rule:
+                logger.info("Email %r matched rule %s", message.subject, rule.name)
+                items.append(self.item(message, rule))
+        return items
+
+    @staticmethod
+    def item(message: MailMessage, rule: Rule) -> IngestItem:
+        message_id = message.headers.get("message-id", [f"{message.from_}:{message.date_str}:{message.subject}"])[0]
+        return IngestItem(source="email",
+                          source_id=message_id,
+                          title=message.subject or f"Email from {message.from_}",
+                          tags=rule.tags,
+                          points=rule.points,
+                          project=rule.project)
+
+
+class MailSource(AsyncIngester):
+    """new matching mail in some folders, as a pipeline source"""
+    name = "email"
+
+    def __init__(self, watcher: MailWatcher | None = None, folders: list[str] | None = None, timeout: float = 60):
+        self.watcher = watcher or MailWatcher()
+        self.folders = folders or [self.watcher.folder]
+        self.concurrency = len(self.folders)
+        self.timeout = timeout
+
+    def partitions(self) -> list[str]:
+        return self.folders
+
+    async def fetch(self, folder: str) -> AsyncIterator[IngestItem]:
+        for item in await asyncio.to_thread(self.watcher.items, folder):
+            yield item
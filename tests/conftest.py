@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    """keep every test's state, tasks and settings in its own temporary directory"""
+    for name in ("STATE_DIR", "TASK_DATA_LOCATION", "SINGULARITY_SOCKET", "SOCKET_PATH",
+                 "SLACK_API_TOKEN", "SLACK_USER_ID", "SLACK_BASE_URL"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("TASK_DATA_LOCATION", str(tmp_path / "task"))
+    monkeypatch.setenv("CALENDAR_EMAIL", "me@example.com")
+    (tmp_path / "state").mkdir()
+    (tmp_path / "task").mkdir()
+    return tmp_path
@@ -0,0 +1,36 @@
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+from src.builder import Builder
+
+DAY = date(2026, 10, 19)
+
+
+def busy(*spans: tuple[str, str]) -> list:
+    return [SimpleNamespace(start=datetime.combine(DAY, time.fromisoformat(s)),
+                            end=datetime.combine(DAY, time.fromisoformat(e))) for s, e in spans]
+
+
+def lunch(blocks) -> list[str]:
+    return [f"{b.start:%H:%M}" for b in blocks if any("lunch" in t.tags for t in b.tasks)]
+
+
+def test_lunch_is_reserved_on_a_day_without_meetings():
+    assert lunch(Builder(DAY)._build_day(DAY, []).blocks) == ["12:00"]
+
+
+def test_lunch_stays_at_noon_around_a_morning_meeting():
+    blocks = Builder(DAY)._build_day(DAY, busy(("10:00", "11:00"))).blocks
+    assert lunch(blocks) == ["12:00"]
+    assert all(b.end <= blocks[i + 1].start for i, b in enumerate(blocks[:-1]))
+    assert [b.index for b in blocks] == list(range(len(blocks)))
+
+
+def test_lunch_moves_to_the_nearest_free_time_when_noon_is_taken():
+    blocks = Builder(DAY)._build_day(DAY, busy(("11:30", "13:30"))).blocks
+    assert lunch(blocks) == ["10:40"]
+
+
+def test_no_lunch_when_turned_off(monkeypatch):
+    monkeypatch.setenv("LUNCH", "false")
+    assert lunch(Builder(DAY)._build_day(DAY, []).blocks) == []
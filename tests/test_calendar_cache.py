@@ -0,0 +1,124 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from gcsa.free_busy import TimeRange
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+
+from src.calendar_cache import BusyCache
+from src.ingester import GoogleCalendarIngester
+
+MONDAY = date(2026, 10, 19)
+
+
+class Request:
+    def __init__(self, service, **kwargs):
+        self.service = service
+        self.kwargs = kwargs
+
+    def execute(self):
+        self.service.calls.append(("events.list", self.kwargs["calendarId"]))
+        return self.service.page(self.kwargs)
+
+
+class Batch:
+    def __init__(self, service):
+        self.service = service
+        self.requests = []
+
+    def add(self, request, callback=None):
+        self.requests.append((request, callback))
+
+    def execute(self):
+        self.service.calls.append(("batch", len(self.requests)))
+        for request, callback in self.requests:
+            try:
+                callback("1", self.service.page(request.kwargs), None)
+            except HttpError as e:
+                callback("1", None, e)
+
+
+class Service:
+    """the slice of the events API the ingester syncs with"""
+
+    def __init__(self, pages: dict[str, int] | None = None):
+        self.calls = []
+        self.pages = pages or {}
+        self.changed: set[str] = set()
+        self.unlisted: set[str] = set()
+
+    def events(self):
+        return SimpleNamespace(list=lambda **kwargs: Request(self, **kwargs))
+
+    def new_batch_http_request(self):
+        return Batch(self)
+
+    def page(self, kwargs: dict) -> dict:
+        calendar_id = kwargs["calendarId"]
+        if calendar_id in self.unlisted:
+            raise HttpError(Response({"status": 404}), b"not found")
+        page = int(kwargs["pageToken"] or 0) + 1
+        items = [{"id": "e"}] if kwargs["syncToken"] is None or calendar_id in self.changed else []
+        if page < self.pages.get(calendar_id, 1):
+            return {"items": items, "nextPageToken": str(page)}
+        return {"items": items, "nextSyncToken": f"{calendar_id}-token"}
+
+
+class Client:
+    def __init__(self, calendar_ids: list[str], service: Service):
+        self.calendar_ids = calendar_ids
+        self.service = service
+
+    @property
+    def calls(self):
+        return self.service.calls
+
+    def get_calendar_list(self):
+        return [SimpleNamespace(id=i) for i in self.calendar_ids]
+
+    def get_free_busy(self, calendar_ids, time_min, time_max):
+        self.calls.append(("freebusy", tuple(calendar_ids)))
+        start = datetime.combine(MONDAY, datetime.min.time()).astimezone() + timedelta(hours=10)
+        return SimpleNamespace(calendars={i: [TimeRange(start, start + timedelta(hours=1))] for i in calendar_ids})
+
+
+def ingester(tmp_path, client: Client) -> GoogleCalendarIngester:
+    return GoogleCalendarIngester(client=client, cache=BusyCache(tmp_path / "cache.json", ttl=900))
+
+
+def test_a_cold_week_costs_one_free_busy_call_and_one_sync_batch(tmp_path):
+    client = Client(["a", "b", "c"], Service())
+    busy = ingester(tmp_path, client).get_busy_by_calendar(MONDAY, MONDAY + timedelta(days=4))
+    assert all(len(ranges) == 1 for ranges in busy.values())
+    assert client.calls == [("freebusy", ("a", "b", "c")), ("batch", 3)]
+
+    ingester(tmp_path, client).get_busy_by_calendar(MONDAY, MONDAY + timedelta(days=4))
+    assert len(client.calls) == 2
+
+
+def test_stale_days_are_revalidated_in_one_batch(tmp_path):
+    client = Client(["a", "b", "c"], Service())
+    calendars = ingester(tmp_path, client)
+    calendars.get_busy_by_calendar(MONDAY, MONDAY)
+    for calendar in calendars.cache.data["calendars"].values():
+        for entry in calendar["days"].values():
+            entry["fetched"] -= 3600
+    client.calls.clear()
+    client.service.changed = {"b"}
+
+    calendars.get_busy_by_calendar(MONDAY, MONDAY)
+    assert client.calls == [("batch", 3), ("freebusy", ("b",))]
+
+
+def test_initial_sync_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setenv("CALENDAR_SYNC_PAGES", "3")
+    client = Client(["small", "big", "other"], Service(pages={"small": 2, "big": 50}))
+    client.service.unlisted = {"other"}
+    calendars = ingester(tmp_path, client)
+    calendars.get_busy_by_calendar(MONDAY, MONDAY)
+
+    assert client.calls.count(("events.list", "small")) == 1
+    assert client.calls.count(("events.list", "big")) == 2
+    assert calendars.cache.sync_token("small") == "small-token"
+    assert calendars.cache.sync_token("big") == ""
+    assert calendars.cache.sync_token("other") == ""
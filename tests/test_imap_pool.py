@@ -0,0 +1,87 @@
+from threading import Event, Thread
+from types import SimpleNamespace
+
+from src.imap_pool import ConnectionPool
+
+ACCOUNT = SimpleNamespace(host="imap.example.com", port=993, username="me", password="secret")
+
+
+class Mailbox:
+    def __init__(self, server: "Server"):
+        self.server = server
+        self.client = SimpleNamespace(noop=self.noop)
+        self.stalled = False
+
+    def login(self, username, password):
+        self.server.logins += 1
+        return self
+
+    def logout(self):
+        self.server.logouts += 1
+
+    def noop(self):
+        if self.stalled:
+            self.server.in_noop.set()
+            self.server.resume.wait(5)
+
+
+class Server:
+    """counts logins, and lets a test hold a NOOP on one mailbox"""
+
+    def __init__(self):
+        self.logins = 0
+        self.logouts = 0
+        self.in_noop = Event()
+        self.resume = Event()
+
+    def __call__(self, host, port):
+        return Mailbox(self)
+
+
+def pool(server: Server) -> ConnectionPool:
+    # the background sweep never comes around during a test, it is called directly
+    return ConnectionPool(max_size=2, keepalive=3600, idle_timeout=3600, mailbox_factory=server)
+
+
+def test_sessions_are_reused():
+    server = Server()
+    connections = pool(server)
+    for _ in range(3):
+        with connections.session(ACCOUNT):
+            pass
+    assert server.logins == 1
+
+
+def test_a_sweep_leaves_the_other_sessions_available_and_stays_within_max_size():
+    server = Server()
+    connections = pool(server)
+    first, second = connections.acquire(ACCOUNT), connections.acquire(ACCOUNT)
+    connections.release(ACCOUNT, second)
+    connections.release(ACCOUNT, first)
+    first.stalled = True
+
+    sweep = Thread(target=connections._sweep)
+    sweep.start()
+    assert server.in_noop.wait(5)
+    # the session being checked counts against max_size, the other one is handed out without a login
+    assert connections.acquire(ACCOUNT) is second
+    assert server.logins == 2
+    key = connections._key(ACCOUNT)
+    assert connections._in_use[key] == 2
+
+    server.resume.set()
+    sweep.join(5)
+    connections.release(ACCOUNT, second)
+    assert connections._in_use[key] == 0
+    assert len(connections._idle[key]) == 2
+
+
+def test_expired_sessions_are_logged_out():
+    server = Server()
+    connections = pool(server)
+    connections.idle_timeout = 0
+    with connections.session(ACCOUNT):
+        pass
+    connections._sweep()
+    assert server.logouts == 1
+    assert connections._idle[connections._key(ACCOUNT)] == []
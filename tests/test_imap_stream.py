@@ -0,0 +1,84 @@
+import re
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from src.checkpoints import CheckpointStore
+from src.ingester import EmailIngester
+
+
+class Mailbox:
+    """an IMAP folder answering the few commands stream_new_emails sends"""
+
+    def __init__(self):
+        self.uidvalidity = 1
+        self.messages: dict[int, date] = {}
+        self.fetches: list[list[int]] = []
+        self.searches = 0
+        self.folder = SimpleNamespace(status=self.status, set=lambda folder: None)
+
+    def add(self, days_ago: int = 0) -> int:
+        uid = max(self.messages, default=0) + 1
+        self.messages[uid] = date.today() - timedelta(days=days_ago)
+        return uid
+
+    def status(self, folder, items):
+        return {"UIDVALIDITY": self.uidvalidity, "UIDNEXT": max(self.messages, default=0) + 1}
+
+    def uids(self, criteria):
+        self.searches += 1
+        if since := re.search(r"SINCE (\S+)\)", str(criteria)):
+            day = datetime.strptime(since.group(1), "%d-%b-%Y").date()
+            return [str(u) for u, d in self.messages.items() if d >= day]
+        first = int(re.search(r"UID (\d+):\*", str(criteria)).group(1))
+        # like a real server, "n:*" matches the newest message even when it is below n
+        return [str(u) for u in self.messages if u >= first] or [str(max(self.messages))]
+
+    def fetch(self, criteria, headers_only, bulk, mark_seen):
+        assert not mark_seen
+        uids = [int(u) for u in re.search(r"UID ([\d,]+)\)", str(criteria)).group(1).split(",")]
+        self.fetches.append(uids)
+        return [SimpleNamespace(uid=str(u)) for u in uids]
+
+
+class Conn:
+    credentials = SimpleNamespace(username="me", host="imap.example.com")
+
+    def __init__(self, mailbox: Mailbox):
+        self.mailbox = mailbox
+
+    def __enter__(self):
+        return self.mailbox
+
+    def __exit__(self, *exc):
+        return False
+
+
+def stream(mailbox: Mailbox, tmp_path, chunk_size: int = 100) -> list[int]:
+    ingester = EmailIngester(conn=Conn(mailbox), checkpoints=CheckpointStore(tmp_path / "checkpoints.json"))
+    return [int(m.uid) for m in ingester.stream_new_emails(folder="INBOX", chunk_size=chunk_size)]
+
+
+def test_only_new_messages_are_fetched_in_chunks(tmp_path):
+    mailbox = Mailbox()
+    mailbox.add(days_ago=30)
+    recent = mailbox.add()
+    assert stream(mailbox, tmp_path, chunk_size=2) == [recent]
+
+    searches = mailbox.searches
+    assert stream(mailbox, tmp_path, chunk_size=2) == []
+    assert mailbox.searches == searches
+
+    new = [mailbox.add() for _ in range(3)]
+    mailbox.fetches.clear()
+    assert stream(mailbox, tmp_path, chunk_size=2) == new
+    assert mailbox.fetches == [new[:2], new[2:]]
+
+
+def test_a_renumbered_folder_starts_over_from_the_initial_window(tmp_path):
+    mailbox = Mailbox()
+    first = mailbox.add()
+    assert stream(mailbox, tmp_path) == [first]
+
+    mailbox.uidvalidity = 2
+    mailbox.add(days_ago=30)
+    assert stream(mailbox, tmp_path) == [first]
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from src.intervals import Interval, common_free, complement, intersection, normalize, union
+
+
+def at(hour: float) -> datetime:
+    return datetime(2026, 10, 19) + timedelta(hours=hour)
+
+
+def span(start: float, end: float) -> Interval:
+    return Interval(at(start), at(end))
+
+
+ALICE = normalize([span(9, 10), span(9.5, 11), span(13, 14)])
+BOB = normalize([span(10, 12), span(13.5, 15)])
+CAROL = normalize([span(10.5, 13.75)])
+
+
+def test_normalize_merges_overlapping_and_drops_empty_ranges():
+    assert normalize([span(11, 12), span(9, 10), span(9.5, 10.5), span(12, 12.5), span(8, 8)]) == \
+        [span(9, 10.5), span(11, 12.5)]
+
+
+def test_union_of_many_calendars():
+    assert union(ALICE, BOB, CAROL) == [span(9, 15)]
+    assert union(ALICE, BOB) == [span(9, 12), span(13, 15)]
+
+
+def test_intersection_of_many_calendars():
+    assert intersection(ALICE, BOB) == [span(10, 11), span(13.5, 14)]
+    assert intersection(ALICE, BOB, CAROL) == [span(10.5, 11), span(13.5, 13.75)]
+    assert intersection(ALICE, []) == []
+    assert intersection() == []
+
+
+def test_complement_within_a_window():
+    assert complement(ALICE, at(8), at(17)) == [span(8, 9), span(11, 13), span(14, 17)]
+    assert complement([], at(9), at(10)) == [span(9, 10)]
+
+
+def test_common_free_keeps_stretches_of_the_minimum_length():
+    assert common_free([ALICE, BOB], [span(8, 17)], minimum=timedelta(hours=1.5)) == [span(15, 17)]
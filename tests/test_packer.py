@@ -0,0 +1,127 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from src import layout
+from src.builder import Builder
+from src.models import BigBlock, MediumBlock, PlanState, SmallBlock, Task
+from src.packer import CapacityBuckets, CapacityTree, Packer, Strategy
+
+START = datetime(2026, 10, 19, 9)
+
+
+def blocks(*types) -> list:
+    return [t(start=START + timedelta(hours=i), end=START + timedelta(hours=i, minutes=45), index=i)
+            for i, t in enumerate(types)]
+
+
+def tasks(*points: int, partial_group: str | None = None) -> list[Task]:
+    return [Task(description=f"task {n}", entry=START, status="pending", uuid=str(uuid.uuid4()),
+                 points=p, partial_group=partial_group) for n, p in enumerate(points)]
+
+
+def placement(day: list, packed: list[Task]) -> list[int | None]:
+    where = {t.uuid: b.index for b in day for t in b.tasks}
+    return [where.get(t.uuid) for t in packed]
+
+
+def test_first_fit_decreasing_takes_the_earliest_block_with_room():
+    day, packed = blocks(MediumBlock, SmallBlock), tasks(4)
+    assert Packer(Strategy.first_fit_decreasing).pack(packed, day) == []
+    assert placement(day, packed) == [0]
+
+
+def test_best_fit_takes_the_block_it_leaves_least_room_in():
+    day, packed = blocks(MediumBlock, SmallBlock), tasks(4)
+    assert Packer(Strategy.best_fit).pack(packed, day) == []
+    assert placement(day, packed) == [1]
+
+
+def test_branch_and_bound_beats_greedy_when_greedy_strands_points():
+    packed = tasks(6, 5, 5)
+    greedy_day, exact_day = blocks(MediumBlock), blocks(MediumBlock)
+    assert len(Packer(Strategy.first_fit_decreasing).pack(packed, greedy_day)) == 2
+    assert [t.points for t in Packer(Strategy.branch_and_bound).pack(packed, exact_day)] == [6]
+    assert exact_day[0].used_points == 10
+
+
+def test_branch_and_bound_keeps_the_greedy_packing_when_out_of_time(caplog):
+    caplog.set_level("INFO", logger="src.packer")
+    rng = random.Random(7)
+    packed = tasks(*(rng.randint(2, 9) for _ in range(30)))
+    greedy_day, exact_day = blocks(*[BigBlock] * 6), blocks(*[BigBlock] * 6)
+    Packer(Strategy.first_fit_decreasing).pack(packed, greedy_day)
+    Packer(Strategy.branch_and_bound, time_budget=0).pack(packed, exact_day)
+
+    assert "hit its 0s budget" in caplog.text
+    assert sum(b.used_points for b in exact_day) >= sum(b.used_points for b in greedy_day)
+
+
+def test_partials_take_a_run_of_consecutive_blocks():
+    day = blocks(BigBlock, SmallBlock, BigBlock, BigBlock, BigBlock)
+    partials = tasks(15, 15, 10, partial_group=str(uuid.uuid4()))
+    assert Packer().pack(partials, day) == []
+    assert placement(day, partials) == [2, 3, 4]
+
+
+def test_a_partial_group_without_room_is_left_out_whole():
+    day = blocks(BigBlock, SmallBlock, BigBlock)
+    partials = tasks(15, 15, partial_group=str(uuid.uuid4()))
+    assert Packer().pack(partials, day) == partials
+    assert all(not b.tasks for b in day)
+
+
+def test_best_fit_matches_a_plain_search_for_the_tightest_block():
+    rng = random.Random(3)
+    for _ in range(200):
+        remaining = [rng.randint(-2, 15) for _ in range(rng.randint(0, 20))]
+        points = [rng.randint(0, 16) for _ in range(rng.randint(0, 40))]
+        state = PlanState(remaining, points)
+        unplaced = Packer(Strategy.best_fit, group_size=len(points) or 1)._greedy(list(range(len(points))), state)
+
+        left, expected = list(remaining), []
+        for i in sorted(range(len(points)), key=lambda i: points[i], reverse=True):
+            fits = [(room, b) for b, room in enumerate(left) if room >= points[i]]
+            if not fits:
+                expected.append(i)
+                continue
+            left[min(fits)[1]] -= points[i]
+        assert unplaced == expected
+        assert list(state.remaining) == left
+
+
+def test_capacity_structures_follow_updates():
+    capacities = [4, 10, 15, 10]
+    tree, buckets = CapacityTree(capacities), CapacityBuckets(capacities)
+    assert (tree.first_fit(10), buckets.best_fit(10)) == (1, 1)
+    capacities[1] = 2
+    tree.update(1, 2)
+    buckets.update(1)
+    assert (tree.first_fit(10), buckets.best_fit(10)) == (2, 3)
+    assert (tree.first_fit(16), buckets.best_fit(16)) == (None, None)
+
+
+SPECS = Builder._block_specs()
+
+
+def exhaustive(gap: int) -> int:
+    """the most points in a gap, trying every sequence of blocks"""
+    best = 0
+    for spec in SPECS:
+        if spec.duration <= gap:
+            best = max(best, spec.points + exhaustive(max(gap - spec.duration - spec.break_size, 0)))
+    return best
+
+
+def test_layout_fits_the_most_points_into_a_gap():
+    for gap in range(0, 240, 7):
+        sequence = layout.solve(gap, SPECS)
+        used = sum(SPECS[i].duration + SPECS[i].break_size for i in sequence[:-1])
+        assert not sequence or used + SPECS[sequence[-1]].duration <= gap
+        assert layout.points(gap, SPECS) == exhaustive(gap)
+
+
+def test_layout_prefers_fewer_bigger_blocks_on_a_tie():
+    big = next(i for i, s in enumerate(SPECS) if s.points == max(s.points for s in SPECS))
+    assert layout.solve(80, SPECS) == (big,)
+    assert layout.solve(24, SPECS) == ()
@@ -0,0 +1,51 @@
+import time
+
+from src.dedupe import DedupeIndex
+from src.pipeline import IngestItem, Pipeline, ThreadedIngester
+from src.repository import TaskRepository
+
+
+def items(source: str, *ids: str) -> list[IngestItem]:
+    return [IngestItem(source=source, source_id=i, title=f"{source} {i}") for i in ids]
+
+
+def pipeline(tmp_path, *sources: ThreadedIngester) -> Pipeline:
+    return Pipeline(list(sources),
+                    repository=TaskRepository(tmp_path / "task"),
+                    index=DedupeIndex(tmp_path / "dedupe.sqlite3"))
+
+
+def test_a_slow_or_failing_source_does_not_hold_up_the_others(tmp_path):
+    def slow(folder):
+        time.sleep(0.3)
+        return items("slow", folder)
+
+    def flaky(folder):
+        if folder == "broken":
+            raise ConnectionError("connection reset")
+        return items("flaky", folder)
+
+    started = time.perf_counter()
+    results = pipeline(tmp_path,
+                       ThreadedIngester("slow", slow, partitions=["a", "b", "c"], timeout=0.5),
+                       ThreadedIngester("flaky", flaky, partitions=["ok", "broken"]),
+                       ThreadedIngester("fast", lambda _: items("fast", "1", "2"))).run_sync()
+
+    assert time.perf_counter() - started < 1
+    assert (results["slow"].created, results["slow"].errors) == (1, ["timed out after 0.5s"])
+    assert (results["flaky"].created, results["flaky"].errors) == (1, ["broken: connection reset"])
+    assert (results["fast"].created, results["fast"].errors) == (2, [])
+    assert len(TaskRepository(tmp_path / "task").all()) == 4
+
+
+def test_items_are_filed_once_even_after_their_task_is_done(tmp_path):
+    source = ThreadedIngester("mail", lambda _: items("mail", "1", "2") + items("mail", "1"))
+    assert pipeline(tmp_path, source).run_sync()["mail"].created == 2
+
+    # completing a task moves it out of pending.data
+    repository = TaskRepository(tmp_path / "task")
+    pending = repository.path.read_text().splitlines(keepends=True)
+    repository.path.write_text(pending[1])
+
+    assert pipeline(tmp_path, source).run_sync()["mail"].created == 0
+    assert repository.path.read_text() == pending[1]
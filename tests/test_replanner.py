@@ -0,0 +1,66 @@
+import uuid
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+from src.models import Task
+from src.replanner import Replanner
+
+DAY = date(2026, 10, 19)
+
+
+def at(hour: str) -> datetime:
+    return datetime.combine(DAY, time.fromisoformat(hour))
+
+
+def task(points: int, description: str = "task", partial_group: str | None = None) -> Task:
+    return Task(description=description, entry=at("08:00"), status="pending", uuid=str(uuid.uuid4()),
+                points=points, partial_group=partial_group)
+
+
+def placed(plan, tasks: list[Task]) -> list[int]:
+    """the index of the block each task is in"""
+    where = {t.uuid: b.index for b in plan.blocks for t in b.tasks}
+    return [where.get(t.uuid) for t in tasks]
+
+
+def plan_partials(replanner: Replanner) -> tuple:
+    group = str(uuid.uuid4())
+    partials = [task(15, "report", group), task(15, "report", group), task(10, "report", group)]
+    plan = replanner.builder._build_day(DAY, [])
+    replanner.builder._assign_tasks_to_blocks(list(partials), plan)
+    assert placed(plan, partials) == [0, 1, 2]
+    return plan, partials
+
+
+def test_a_displaced_partial_takes_its_whole_group_along(monkeypatch):
+    monkeypatch.setenv("LUNCH", "false")
+    replanner = Replanner()
+    plan, partials = plan_partials(replanner)
+
+    meeting = SimpleNamespace(start=at("11:00"), end=at("12:00"))
+    plan = replanner._update(plan, [meeting], {t.uuid: t for t in partials}, now=at("08:30"))
+    assert placed(plan, partials) == [2, 3, 4]
+
+
+def test_a_group_with_no_room_left_is_not_split(monkeypatch):
+    monkeypatch.setenv("LUNCH", "false")
+    replanner = Replanner()
+    plan, partials = plan_partials(replanner)
+
+    meeting = SimpleNamespace(start=at("13:00"), end=at("14:00"))
+    plan = replanner._update(plan, [meeting], {t.uuid: t for t in partials}, now=at("08:30"))
+    assert placed(plan, partials) == [None, None, None]
+
+
+def test_blocks_that_still_fit_keep_their_tasks(monkeypatch):
+    monkeypatch.setenv("LUNCH", "false")
+    first, second = task(5, "first"), task(5, "second")
+    tasks = {t.uuid: t for t in (first, second)}
+    replanner = Replanner()
+    plan = replanner.builder._build_day(DAY, [])
+    replanner.builder._assign_tasks_to_blocks([first, second], plan)
+    names = [b.name for b in plan.blocks]
+
+    plan = replanner._update(plan, [SimpleNamespace(start=at("15:30"), end=at("17:00"))], tasks, now=at("08:30"))
+    assert [b.name for b in plan.blocks] == names[:len(plan.blocks)]
+    assert placed(plan, [first, second]) == [0, 0]
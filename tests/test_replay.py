@@ -0,0 +1,12 @@
+from src.replay import Replay, synthetic_events
+
+
+def test_a_burst_reaches_slack_through_the_hook_and_daemon():
+    records, stream = synthetic_events(bursts=1, burst_size=1, tasks=2, seed=1)
+    report = Replay("daemon", debounce=0.05, slack_latency=0, timeout=10, quiet=0.3).run(records, stream)
+
+    [burst] = report.bursts
+    assert burst.correct
+    assert burst.latency is not None
+    assert burst.writes == burst.needed_writes > 0
+    assert report.rate_limited == 0
@@ -0,0 +1,64 @@
+import json
+
+from taskw.utils import encode_task
+
+from src.fake_slack import FakeSlack
+from src.ratelimit import METHOD_LIMITS, RateLimiter
+from src.team import Member, Team
+
+
+def member(tmp_path, n: int) -> Member:
+    """a member with one active task"""
+    data = tmp_path / f"task{n}"
+    data.mkdir()
+    (data / "pending.data").write_text(encode_task({
+        "uuid": f"00000000-0000-0000-0000-00000000000{n}", "description": f"task {n}", "status": "pending",
+        "entry": "1700000000", "start": "1700000000", "points": "1", "publictext": f"thing {n}"}))
+    return Member(user_id=f"U{n}", token=f"xoxp-{n}", task_data_location=str(data),
+                  state_dir=str(tmp_path / f"state{n}"))
+
+
+def test_the_limiter_keeps_a_team_under_slacks_limits(tmp_path):
+    limits = {method: 60 for method in METHOD_LIMITS}
+    members = [member(tmp_path, n) for n in range(4)]
+    with FakeSlack({m.token: m.user_id for m in members}, limits=limits) as slack:
+        limiter = RateLimiter(burst=3, limits=limits)
+        team = Team(members, limiter=limiter, base_url=slack.base_url)
+        assert team.sync() == {}
+
+        assert slack.count(status=429) == 0
+        assert limiter.waited
+        for n, m in enumerate(members):
+            text = slack.status(m.user_id)["status_text"].removeprefix("Working on: ")
+            assert set(text.split(" and ")) == {f"thing {n}", "focus work"}
+
+
+def test_one_members_failure_does_not_stop_the_others(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLACK_MAX_RETRIES", "0")
+    members = [member(tmp_path, n) for n in range(4)]
+    # U2's token is unknown to Slack and U3 can not reach it at all
+    with FakeSlack({m.token: m.user_id for m in members[:2] + members[3:]}) as slack:
+        team = Team(members, base_url=slack.base_url)
+
+        def unreachable():
+            raise ConnectionError("connection reset")
+        team.slacker("U3").update_statuses_based_on_current_state = unreachable
+        errors = team.sync()
+
+        assert sorted(errors) == ["U2", "U3"]
+        assert all(slack.status(m.user_id)["dnd"] for m in members[:2])
+
+
+def test_members_without_their_own_tasks_or_state_are_skipped(tmp_path):
+    path = tmp_path / "team.json"
+    path.write_text(json.dumps([{"user_id": "U1", "token": "xoxp-1", "task_data_location": str(tmp_path),
+                                 "state_dir": str(tmp_path)},
+                                {"user_id": "U2", "token": "xoxp-2", "state_dir": str(tmp_path)},
+                                {"user_id": "U3", "token": "xoxp-3", "task_data_location": str(tmp_path)}]))
+    assert list(Team.load(path).members) == ["U1"]
+
+
+def test_members_keep_their_own_plans(tmp_path):
+    team = Team([member(tmp_path, n) for n in range(2)])
+    assert [team.slacker(f"U{n}").plans.path for n in range(2)] == \
+        [tmp_path / "state0" / "plans.sqlite3", tmp_path / "state1" / "plans.sqlite3"]
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from src.dedupe import DedupeIndex
+from src.repository import TaskRepository
+from src.watcher import MailWatcher, Rule, RuleSet
+
+
+class Ingester:
+    """hands out whatever messages the test queued, like a folder whose checkpoint was lost"""
+    ALL_MAILBOX = "INBOX"
+
+    def __init__(self):
+        self.queued = []
+
+    def stream_new_emails(self, folder, headers=None):
+        yield from self.queued
+
+    @classmethod
+    def labels(cls, message):
+        return set()
+
+
+def message(n: int, subject: str = "Invoice") -> SimpleNamespace:
+    return SimpleNamespace(subject=f"{subject} {n}", from_="billing@example.com", date_str="",
+                           headers={"message-id": [f"<{n}@example.com>"]})
+
+
+def watcher(tmp_path, ingester: Ingester) -> MailWatcher:
+    return MailWatcher(ingester,
+                       rules=RuleSet([Rule(name="bills", sender="billing", tags=["bills"])]),
+                       repository=TaskRepository(tmp_path / "task"),
+                       index=DedupeIndex(tmp_path / "dedupe.sqlite3"),
+                       idle_wait=1)
+
+
+def test_a_message_seen_again_is_not_filed_again(tmp_path):
+    ingester = Ingester()
+    ingester.queued = [message(1), message(2)]
+    assert len(watcher(tmp_path, ingester).drain()) == 2
+
+    # the task for the first message is completed, then the folder is read from scratch
+    repository = TaskRepository(tmp_path / "task")
+    pending = repository.path.read_text().splitlines(keepends=True)
+    repository.path.write_text(pending[1])
+    ingester.queued = [message(1), message(2), message(3)]
+
+    filed = watcher(tmp_path, ingester).drain()
+    assert [r["description"] for r in filed] == ["Invoice 3"]
+    assert len(repository.all()) == 2